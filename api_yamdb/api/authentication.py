@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from copy import copy
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import get_versions
+
+# Поля пользователя, которые читают разрешения api; копии лежат в токене.
+ROLE_CLAIMS = ('role', 'is_staff', 'is_superuser')
+# Версии в общем кеше: всех пользователей (массовая загрузка) и одного.
+USERS_RESOURCE = 'users'
+USER_RESOURCE = 'users:{}'
+
+
+def get_user_versions(user_id):
+    return get_versions(USERS_RESOURCE, USER_RESOURCE.format(user_id))
+
+
+def get_user_cache_timeout():
+    return getattr(settings, 'API_AUTH_USER_CACHE_TIMEOUT', 0)
+
+
+def get_access_token(user):
+    """Access-токен с ролью и флагами администратора пользователя."""
+    token = AccessToken.for_user(user)
+    for claim in ROLE_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class UserCache:
+    """Процессный LRU пользователей по id с временем жизни записей.
+
+    Размер и время жизни задают API_AUTH_USER_CACHE_SIZE и
+    API_AUTH_USER_CACHE_TIMEOUT; 0 секунд выключает кеш. Запись хранит
+    версии пользователя из общего кеша на момент чтения из базы и
+    выдаётся, только пока они не изменились: изменение или удаление
+    пользователя в любом процессе меняет версию после коммита. Наружу
+    отдаются копии, чтобы изменения request.user в одном запросе не
+    попали в другие.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = OrderedDict()
+
+    def get(self, user_id, versions):
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            user, expires, user_versions = entry
+            if expires <= time.monotonic() or user_versions != versions:
+                del self.users[user_id]
+                return None
+            self.users.move_to_end(user_id)
+        return copy(user)
+
+    def set(self, user, versions):
+        timeout = get_user_cache_timeout()
+        if not timeout:
+            return
+        size = getattr(settings, 'API_AUTH_USER_CACHE_SIZE', 1024)
+        with self.lock:
+            self.users[user.pk] = (
+                copy(user), time.monotonic() + timeout, versions
+            )
+            self.users.move_to_end(user.pk)
+            while len(self.users) > size:
+                self.users.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, который берёт пользователя из user_cache.
+
+    База читается только при промахе кеша, после изменения пользователя
+    или если роль в токене расходится с закешированной: тогда решает
+    свежая строка из базы.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(
+                'Токен не содержит идентификатора пользователя'
+            )
+        if api_settings.CHECK_REVOKE_TOKEN or not get_user_cache_timeout():
+            # Кеш выключен или сверке с хешем пароля нужна свежая строка.
+            return super().get_user(validated_token)
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        # Версии читаются до базы: изменение, закоммиченное между ними и
+        # чтением строки, сбросит запись при следующем запросе.
+        versions = get_user_versions(user_id)
+        user = user_cache.get(user_id, versions)
+        if user is not None and all(
+            validated_token.get(claim, getattr(user, claim))
+            == getattr(user, claim)
+            for claim in ROLE_CLAIMS
+        ):
+            return user
+        # Неактивных пользователей родитель отклоняет, в кеш они не попадут.
+        user = super().get_user(validated_token)
+        user_cache.set(user, versions)
+        return user
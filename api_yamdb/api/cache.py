@@ -0,0 +1,118 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from reviews.models import Category, Genre
+from .metrics import metrics_registry
+
+VERSION_KEY = 'api:version:{}'
+
+
+def get_versions(*resources):
+    """Текущие версии ресурсов; отсутствующие заводятся заново.
+
+    Версия — время последней записи в наносекундах: после вытеснения из
+    кеша новая версия не совпадёт ни с одной из прежних.
+    """
+    keys = [VERSION_KEY.format(resource) for resource in resources]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def bump_versions(*resources):
+    """Делает устаревшими все закешированные ответы по ресурсам."""
+    now = time.time_ns()
+    cache.set_many(
+        {VERSION_KEY.format(resource): now for resource in resources},
+        timeout=None
+    )
+
+
+def get_response_cache_timeout():
+    return getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 0)
+
+
+def is_conditional_get_enabled():
+    return getattr(settings, 'API_CONDITIONAL_GET', False)
+
+
+def get_slug_cache_timeout():
+    return getattr(settings, 'API_SLUG_CACHE_TIMEOUT', 0)
+
+
+def count_response_cache(outcome):
+    metrics_registry.increment('response_cache', outcome)
+
+
+def get_response_cache_stats():
+    """Счётчики попаданий и промахов кеша ответов всех процессов."""
+    _, counters = metrics_registry.collect()
+    return {
+        outcome: counters['response_cache', outcome]
+        for outcome in ('hits', 'misses')
+    }
+
+
+class SlugCache:
+    """Процессный кеш строк маленького справочника по slug.
+
+    Сбрасывается сигналами своего процесса, а записи других процессов
+    видит по версии ресурса в общем кеше и не дольше
+    API_SLUG_CACHE_TIMEOUT секунд; при 0 каждый вызов идёт в базу. Промахи
+    догружаются одним запросом на все недостающие slug.
+    """
+
+    def __init__(self, model, resource):
+        self.model = model
+        self.resource = resource
+        self.field_names = [
+            field.attname for field in model._meta.concrete_fields
+        ]
+        self.clear()
+
+    def clear(self):
+        self.rows = {}
+        self.version = None
+        self.expires = 0
+
+    def get_rows(self):
+        timeout = get_slug_cache_timeout()
+        if not timeout:
+            return {}
+        version = get_versions(self.resource)[0]
+        now = time.monotonic()
+        if version != self.version or now >= self.expires:
+            self.rows = {}
+            self.version = version
+            self.expires = now + timeout
+        return self.rows
+
+    def get_many(self, slugs):
+        """Объекты по slug; отсутствующих в базе slug нет в ответе."""
+        rows = self.get_rows()
+        missing = {slug for slug in slugs if slug not in rows}
+        if missing:
+            slug_index = self.field_names.index('slug')
+            for row in self.model.objects.filter(
+                slug__in=missing
+            ).values_list(*self.field_names):
+                rows[row[slug_index]] = row
+        return {
+            slug: self.model.from_db(
+                DEFAULT_DB_ALIAS, self.field_names, rows[slug]
+            )
+            for slug in slugs
+            if slug in rows
+        }
+
+
+slug_caches = {
+    Category: SlugCache(Category, 'categories'),
+    Genre: SlugCache(Genre, 'genres'),
+}
@@ -0,0 +1,45 @@
+from django.utils.encoding import smart_str
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from .cache import slug_caches
+
+
+class CachedManyRelatedField(serializers.ManyRelatedField):
+    """Разрешает весь список slug за одно обращение к кешу."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.to_internal_values(data)
+
+
+class CachedSlugRelatedField(serializers.SlugRelatedField):
+    """SlugRelatedField, который берёт объекты из SlugCache модели."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return CachedManyRelatedField(**list_kwargs)
+
+    def to_internal_value(self, data):
+        return self.to_internal_values([data])[0]
+
+    def to_internal_values(self, data):
+        if not all(isinstance(slug, (str, int)) for slug in data):
+            self.fail('invalid')
+        data = [str(slug) for slug in data]
+        found = slug_caches[self.get_queryset().model].get_many(data)
+        for slug in data:
+            if slug not in found:
+                self.fail(
+                    'does_not_exist',
+                    slug_name=self.slug_field,
+                    value=smart_str(slug)
+                )
+        return [found[slug] for slug in data]
@@ -0,0 +1,302 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+PREFIX = 'yamdb'
+# Счётчики завершившихся процессов, сложенные в один файл.
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = '.lock'
+# Гистограмма -> верхние границы корзин; последняя корзина — +Inf.
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    ),
+    'request_db_queries': (1, 2, 3, 5, 10, 20, 50, 100),
+    'response_size_bytes': (
+        256, 1024, 4096, 16384, 65536, 262144, 1048576,
+    ),
+}
+HELP = {
+    'requests_total': 'Число запросов по view и классу статуса.',
+    'request_duration_seconds': 'Время обработки запроса.',
+    'request_db_queries': 'SQL-запросов на запрос.',
+    'response_size_bytes': 'Размер тела ответа.',
+    'throttled_requests_total': 'Запросов, отклонённых лимитами (429).',
+}
+
+
+def get_metrics_dir():
+    """Каталог файлов метрик процессов; None — только этот процесс."""
+    return getattr(settings, 'API_METRICS_DIR', None)
+
+
+def get_flush_interval():
+    return getattr(settings, 'API_METRICS_FLUSH_INTERVAL', 1)
+
+
+def new_series():
+    return {
+        'requests': 0,
+        **{
+            name: {'sum': 0, 'buckets': [0] * (len(bounds) + 1)}
+            for name, bounds in HISTOGRAMS.items()
+        },
+    }
+
+
+def copy_series(series):
+    return {
+        'requests': series['requests'],
+        **{
+            name: {
+                'sum': series[name]['sum'],
+                'buckets': list(series[name]['buckets']),
+            }
+            for name in HISTOGRAMS
+        },
+    }
+
+
+def make_snapshot(series, counters):
+    """Содержимое файла процесса: серии и счётчики списками для JSON."""
+    return {
+        'series': [
+            [view, status, values]
+            for (view, status), values in series.items()
+        ],
+        'counters': [
+            [name, label, count] for (name, label), count in counters.items()
+        ],
+    }
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def get_file_pid(path):
+    """pid из имени файла процесса {pid}-{время}.json, иначе None."""
+    pid = path.stem.split('-')[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def merge_series(target, series):
+    target['requests'] += series['requests']
+    for name in HISTOGRAMS:
+        target[name]['sum'] += series[name]['sum']
+        target[name]['buckets'] = [
+            total + count for total, count in zip(
+                target[name]['buckets'], series[name]['buckets']
+            )
+        ]
+
+
+class MetricsRegistry:
+    """Метрики запросов процесса по парам (view, класс статуса).
+
+    Кроме гистограмм запросов держит простые счётчики (попадания кеша
+    ответов, отклонённые лимитами запросы) по парам (имя, метка). Запрос
+    держит блокировку только на время сложения чисел. Раз в
+    API_METRICS_FLUSH_INTERVAL секунд снимок целиком записывается в файл
+    процесса в API_METRICS_DIR; эндпоинт метрик складывает файлы всех
+    процессов, а файлы завершившихся переносит в archive.json, так что
+    счётчики не теряются и каталог не растёт.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.counters = Counter()
+        self.pid = os.getpid()
+        self.file_name = None
+        self.flushed_at = 0
+
+    def observe(self, view, status, duration, queries, size):
+        key = (view, f'{status // 100}xx')
+        values = {
+            'request_duration_seconds': duration,
+            'request_db_queries': queries,
+            'response_size_bytes': size,
+        }
+        indexes = {
+            name: bisect_left(HISTOGRAMS[name], value)
+            for name, value in values.items()
+        }
+        with self.lock:
+            self.check_fork()
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = new_series()
+            series['requests'] += 1
+            for name, value in values.items():
+                series[name]['sum'] += value
+                series[name]['buckets'][indexes[name]] += 1
+        self.flush_if_due()
+
+    def increment(self, name, label):
+        with self.lock:
+            self.check_fork()
+            self.counters[name, label] += 1
+        self.flush_if_due()
+
+    def check_fork(self):
+        if self.pid != os.getpid():
+            # Процесс форкнут: счётчики родителя остаются в его файле.
+            self.pid = os.getpid()
+            self.file_name = None
+            self.series.clear()
+            self.counters.clear()
+
+    def flush_if_due(self):
+        if time.monotonic() - self.flushed_at >= get_flush_interval():
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            series = {
+                key: copy_series(values)
+                for key, values in self.series.items()
+            }
+            return make_snapshot(series, self.counters)
+
+    def flush(self):
+        """Атомарно переписывает файл процесса: tmp-файл и os.replace."""
+        self.flushed_at = time.monotonic()
+        metrics_dir = get_metrics_dir()
+        if metrics_dir is None:
+            return
+        if self.file_name is None:
+            self.file_name = f'{os.getpid()}-{time.time_ns()}.json'
+        path = Path(metrics_dir) / self.file_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(
+            f'{self.file_name}.{threading.get_ident()}.tmp'
+        )
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Серии по (view, класс статуса) и счётчики всех процессов."""
+        metrics_dir = get_metrics_dir()
+        if metrics_dir is None:
+            return merge_snapshots([self.snapshot()])
+        self.flush()
+        metrics_dir = Path(metrics_dir)
+        with open(metrics_dir / LOCK_FILE, 'w') as lock:
+            # Один сборщик за раз: иначе два переноса в архив сложили бы
+            # файл завершившегося процесса дважды.
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            snapshots = {}
+            for path in metrics_dir.glob('*.json'):
+                try:
+                    snapshots[path] = json.loads(path.read_text())
+                except (OSError, ValueError):
+                    # Файл процесса удалили между glob и чтением.
+                    continue
+            self.archive_dead(metrics_dir, snapshots)
+        return merge_snapshots(snapshots.values())
+
+    def archive_dead(self, metrics_dir, snapshots):
+        """Переносит файлы завершившихся процессов в archive.json."""
+        dead = [
+            path for path in snapshots
+            if (pid := get_file_pid(path)) is not None
+            and pid != os.getpid() and not is_process_alive(pid)
+        ]
+        if not dead:
+            return
+        archive_path = metrics_dir / ARCHIVE_FILE
+        archive = make_snapshot(*merge_snapshots([
+            snapshots.get(archive_path, make_snapshot({}, {})),
+            *(snapshots.pop(path) for path in dead),
+        ]))
+        temporary = archive_path.with_name(f'{ARCHIVE_FILE}.tmp')
+        temporary.write_text(json.dumps(archive))
+        os.replace(temporary, archive_path)
+        snapshots[archive_path] = archive
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+            self.counters.clear()
+
+
+def merge_snapshots(snapshots):
+    series = {}
+    counters = Counter()
+    for snapshot in snapshots:
+        for view, status, values in snapshot['series']:
+            merge_series(
+                series.setdefault((view, status), new_series()), values
+            )
+        for name, label, count in snapshot['counters']:
+            counters[name, label] += count
+    return series, counters
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(merged, counters):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = [
+        f'# HELP {PREFIX}_requests_total {HELP["requests_total"]}',
+        f'# TYPE {PREFIX}_requests_total counter',
+    ]
+    keys = sorted(merged)
+    for view, status in keys:
+        lines.append(
+            f'{PREFIX}_requests_total{{view="{view}",status="{status}"}} '
+            f'{merged[view, status]["requests"]}'
+        )
+    for name, bounds in HISTOGRAMS.items():
+        metric = f'{PREFIX}_{name}'
+        lines.append(f'# HELP {metric} {HELP[name]}')
+        lines.append(f'# TYPE {metric} histogram')
+        for view, status in keys:
+            histogram = merged[view, status][name]
+            labels = f'view="{view}",status="{status}"'
+            cumulative = 0
+            for bound, count in zip(
+                (*map(format_value, bounds), '+Inf'), histogram['buckets']
+            ):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'{metric}_sum{{{labels}}} {format_value(histogram["sum"])}'
+            )
+            lines.append(f'{metric}_count{{{labels}}} {cumulative}')
+    for outcome in ('hits', 'misses'):
+        metric = f'{PREFIX}_response_cache_{outcome}_total'
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {counters["response_cache", outcome]}')
+    metric = f'{PREFIX}_throttled_requests_total'
+    lines.append(f'# HELP {metric} {HELP["throttled_requests_total"]}')
+    lines.append(f'# TYPE {metric} counter')
+    for name, kind in sorted(counters):
+        if name == 'throttled_requests':
+            lines.append(
+                f'{metric}{{throttle="{kind}"}} {counters[name, kind]}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,105 @@
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import metrics_registry
+from .timing import RequestTimings, request_timings
+
+# Замеряются только запросы к API: админка и redoc идут без замеров.
+API_PATH_PREFIX = '/api/'
+
+
+def is_api_request(request):
+    return request.path_info.startswith(API_PATH_PREFIX)
+
+
+class ServerTimingMiddleware:
+    """Заголовок Server-Timing: база, доступ, view, сериализация, итог.
+
+    С API_QUERY_COUNT_HEADER добавляет X-Query-Count. При выключенном
+    API_SERVER_TIMING Django не подключает middleware вовсе, а замеры во
+    view и сериализаторах сводятся к чтению пустой contextvar.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_SERVER_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.query_count_header = getattr(
+            settings, 'API_QUERY_COUNT_HEADER', False
+        )
+
+    def __call__(self, request):
+        if not is_api_request(request):
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        timings.durations['total'] = perf_counter() - started
+        response['Server-Timing'] = timings.get_server_timing()
+        if self.query_count_header:
+            response['X-Query-Count'] = str(timings.queries)
+        return response
+
+
+class MetricsMiddleware:
+    """Счётчики, время, SQL-запросы и размер ответа по view для /metrics/.
+
+    Метка ставится в process_view по классу view и действию ViewSet;
+    запросы к API, не дошедшие до view, попадают в unmatched. Если запрос уже
+    замеряет ServerTimingMiddleware, его счётчик SQL используется повторно.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_api_request(request):
+            return self.get_response(request)
+        request.metrics_view = 'unmatched'
+        started = perf_counter()
+        timings = request_timings.get()
+        if timings is None:
+            timings = RequestTimings()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        metrics_registry.observe(
+            request.metrics_view,
+            response.status_code,
+            perf_counter() - started,
+            timings.queries,
+            0 if response.streaming else len(response.content),
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not hasattr(request, 'metrics_view'):
+            return None
+        view_class = getattr(view_func, 'cls', None) or getattr(
+            view_func, 'view_class', None
+        )
+        if view_class is None:
+            request.metrics_view = view_func.__name__
+            return None
+        method = request.method.lower()
+        actions = getattr(view_func, 'actions', None) or {}
+        request.metrics_view = (
+            f'{view_class.__name__}.{actions.get(method, method)}'
+        )
+        return None
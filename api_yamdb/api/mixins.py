@@ -0,0 +1,202 @@
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import (
+    count_response_cache,
+    get_response_cache_timeout,
+    get_versions,
+    is_conditional_get_enabled,
+)
+from .timing import request_timings
+
+
+class TimedViewMixin:
+    """Замеры для Server-Timing: проверки доступа (auth) и весь view."""
+
+    def initial(self, request, *args, **kwargs):
+        timings = request_timings.get()
+        if timings is None:
+            return super().initial(request, *args, **kwargs)
+        with timings.measure('auth'):
+            return super().initial(request, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        timings = request_timings.get()
+        if timings is None:
+            return super().dispatch(request, *args, **kwargs)
+        with timings.measure('view'):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReadHandlerMixin:
+    """Пропускает list и retrieve через цепочку handle_read.
+
+    Вьюсеты с retrieve вызывают handle_read сами: объявить retrieve здесь
+    значило бы добавить detail-маршрут вьюсетам, где его нет.
+    """
+    cache_resources = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.handle_read(super().list, request, *args, **kwargs)
+
+    def handle_read(self, handler, request, *args, **kwargs):
+        return handler(request, *args, **kwargs)
+
+    def get_cache_resources(self):
+        """Ресурсы, от версий которых зависит ответ."""
+        return self.cache_resources
+
+    def get_representation_key(self, request):
+        """Хеш представления: путь, параметры, формат и версии ресурсов."""
+        if not hasattr(self, '_representation_key'):
+            versions = get_versions(*self.get_cache_resources())
+            query = '&'.join(
+                f'{key}={value}'
+                for key, values in sorted(request.query_params.lists())
+                for value in values
+            )
+            raw_key = (
+                f'{":".join(map(str, versions))}:'
+                f'{request.accepted_renderer.format}:{request.path}?{query}'
+            )
+            self._representation_key = md5(raw_key.encode()).hexdigest()
+            self._last_modified = max(versions) // 10 ** 9
+        return self._representation_key
+
+
+class ConditionalGetMixin(ReadHandlerMixin):
+    """Отвечает 304 на If-None-Match/If-Modified-Since без сборки тела.
+
+    ETag и Last-Modified выводятся из версий ресурсов, которые хранятся в
+    кеше, поэтому проверка не обращается к базе данных. Без общего кеша
+    версии у каждого процесса свои, и заголовки не выдаются.
+    """
+
+    def handle_read(self, handler, request, *args, **kwargs):
+        if not is_conditional_get_enabled():
+            return super().handle_read(handler, request, *args, **kwargs)
+        etag = f'"{self.get_representation_key(request)}"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=self._last_modified
+        )
+        if response is not None:
+            return response
+        response = super().handle_read(handler, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(self._last_modified)
+        return response
+
+
+class CachedResponseMixin(ReadHandlerMixin):
+    """Кеширует отрендеренные ответы list и retrieve.
+
+    Запись в любой из ресурсов cache_resources меняет его версию, а с ней и
+    ключ, поэтому устаревший ответ больше не будет найден.
+    """
+
+    def handle_read(self, handler, request, *args, **kwargs):
+        timeout = get_response_cache_timeout()
+        # Страницы browsable API содержат данные пользователя.
+        if not timeout or request.accepted_renderer.format == 'api':
+            return super().handle_read(handler, request, *args, **kwargs)
+        key = f'api:response:{self.get_representation_key(request)}'
+        cached = cache.get(key)
+        if cached is not None:
+            count_response_cache('hits')
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        count_response_cache('misses')
+        response = super().handle_read(handler, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response.add_post_render_callback(
+                lambda rendered: cache.set(
+                    key,
+                    (rendered.content, rendered['Content-Type']),
+                    timeout
+                )
+            )
+        return response
+
+
+class SparseFieldsetMixin:
+    """Параметры ?fields= и ?omit= для GET-запросов.
+
+    Сужают не только ответ, но и запрос к базе: колонки из sparse_defer
+    откладываются, а связи из sparse_select_related и sparse_prefetch_related
+    подгружаются, только если их поле попало в ответ.
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+    sparse_defer = {}
+    sparse_select_related = {}
+    sparse_prefetch_related = {}
+
+    def get_requested_fields(self):
+        """Поля ответа в порядке сериализатора; None — все поля."""
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = self.parse_requested_fields()
+        return self._requested_fields
+
+    def parse_requested_fields(self):
+        params = self.request.query_params
+        if self.request.method not in SAFE_METHODS or (
+            self.fields_query_param not in params
+            and self.omit_query_param not in params
+        ):
+            return None
+        available = self.get_serializer_class().Meta.fields
+        requested = set(available)
+        if self.fields_query_param in params:
+            requested = set(
+                params[self.fields_query_param].replace(' ', '').split(',')
+            )
+        requested -= set(
+            params.get(self.omit_query_param, '').replace(' ', '').split(',')
+        )
+        return tuple(field for field in available if field in requested)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def prune_queryset(self, queryset):
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+        deferred = [
+            column
+            for field, columns in self.sparse_defer.items()
+            if field not in fields
+            for column in columns
+        ]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        select_related = [
+            lookup
+            for field, lookup in self.sparse_select_related.items()
+            if field in fields
+        ]
+        prefetch_related = [
+            lookup
+            for field, lookup in self.sparse_prefetch_related.items()
+            if field in fields
+        ]
+        # select_related() без аргументов включил бы все связи.
+        if self.sparse_select_related:
+            queryset = queryset.select_related(None)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if self.sparse_prefetch_related:
+            queryset = queryset.prefetch_related(None).prefetch_related(
+                *prefetch_related
+            )
+        return queryset
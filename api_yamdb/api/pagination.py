@@ -0,0 +1,183 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} нельзя положить в курсор')
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по ключу сортировки: без OFFSET и COUNT.
+
+    Ключом служит сортировка queryset (после OrderingFilter) или модели,
+    дополненная первичным ключом, чтобы позиция была однозначной.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.page_query_param
+        )
+        self.model_meta = queryset.model._meta
+        self.ordering = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+        queryset = queryset.order_by(*(
+            f'-{name}' if descending else name
+            for name, descending in self.ordering
+        ))
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(position, reverse)
+            )
+        if reverse:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        del rows[self.page_size:]
+        if reverse:
+            rows.reverse()
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.page = rows
+        return rows
+
+    def get_ordering(self, queryset):
+        model_meta = self.model_meta
+        ordering = []
+        for name in (queryset.query.order_by or model_meta.ordering):
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name == 'pk':
+                name = model_meta.pk.name
+            ordering.append((name, descending))
+        if model_meta.pk.name not in {name for name, _ in ordering}:
+            ordering.append((model_meta.pk.name, False))
+        return ordering
+
+    def get_position_filter(self, position, reverse):
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, position):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Лишняя с виду граница по первому ключу превращает OR в диапазон
+        # индекса: без неё база перебирает строки и сортирует их заново,
+        # и страница в начале списка стоит дороже, чем в конце.
+        (name, descending), value = self.ordering[0], position[0]
+        lookup = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{name}__{lookup}': value}) & condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()))
+            raw_position, reverse = payload['p'], bool(payload['r'])
+            if len(raw_position) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.model_meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, raw_position)
+            ]
+        except (
+            BinasciiError, KeyError, TypeError, ValueError, ValidationError
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, row, reverse):
+        position = [
+            row[name] if isinstance(row, dict) else getattr(row, name)
+            for name, _ in self.ordering
+        ]
+        payload = json.dumps(
+            {'p': position, 'r': int(reverse)},
+            default=_encode_value,
+            separators=(',', ':'),
+        )
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            urlsafe_b64encode(payload.encode()).decode()
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {
+                    'type': 'string', 'nullable': True, 'format': 'uri'
+                },
+                'results': schema,
+            },
+        }
+
+
+class PageNumberOrCursorPagination(PageNumberPagination):
+    """Номерная пагинация; с параметром ?cursor= — курсорная.
+
+    Пустой ?cursor= открывает первую страницу в курсорном режиме,
+    дальше клиент идёт по ссылкам next/previous.
+    """
+    cursor_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_class = self.cursor_pagination_class
+        if cursor_class.cursor_query_param in request.query_params:
+            self.cursor_paginator = cursor_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [{
+            'name': self.cursor_pagination_class.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Курсор страницы; пустое значение включает '
+                           'курсорную пагинацию.',
+            'schema': {'type': 'string'},
+        }]
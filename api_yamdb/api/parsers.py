@@ -0,0 +1,34 @@
+import io
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+from django.conf import settings
+from rest_framework import parsers
+
+# orjson читает целые за пределами 64 бит как float, а в теле запроса
+# такие числа редки: с ними разбирает DRF.
+LONG_INTEGER = re.compile(rb'\d{19}')
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser на orjson; без orjson — стандартный парсер DRF.
+
+    Тела с длинными целыми и тела, которые orjson не разобрал, разбирает
+    DRF: результат и сообщения об ошибках те же, что у JSONParser.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if LONG_INTEGER.search(body) is None:
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
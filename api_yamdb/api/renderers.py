@@ -0,0 +1,50 @@
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+from rest_framework import renderers
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+# Типы, которых нет в orjson (и datetime, чтобы формат совпадал с DRF),
+# кодируются так же, как в стандартном JSONRenderer.
+encode_default = JSONEncoder().default
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer на orjson; без orjson — стандартный рендерер DRF.
+
+    Байты совпадают с JSONRenderer, кроме float: orjson пишет 1e16 вместо
+    1e+16 и 0.00001 вместо 1e-05, а NaN и бесконечность — как null, где
+    DRF со STRICT_JSON падает. Сериализаторы API float не выдают. Чего
+    orjson не умеет, например целые длиннее 64 бит, рендерит DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or not api_settings.COMPACT_JSON
+            or not api_settings.UNICODE_JSON
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if data is None:
+            return b''
+        try:
+            ret = orjson.dumps(
+                data,
+                default=encode_default,
+                option=(
+                    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+                ),
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Как и DRF, экранируем разделители строк, недопустимые в JS.
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
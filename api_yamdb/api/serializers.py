@@ -1,19 +1,26 @@
 import random
+from secrets import compare_digest
+from collections import defaultdict
+from functools import partial
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.fields import SkipField
+from rest_framework.settings import api_settings
 
 from reviews.models import (
     Category,
     Genre,
     Title,
     Review,
-    Comment
+    Comment,
+    ConfirmationCode,
+    TitleGenre
 )
+from reviews.outbox import enqueue_email
 from reviews.constants import (
     MAX_NAME_FIELD_LENGTH,
     MAX_LENGTH_EMAIL,
@@ -21,12 +28,60 @@ from reviews.constants import (
     CONFIRMATION_CODE_MAX,
     CONFIRMATION_CODE_LENGTH
 )
+from .authentication import get_access_token
+from .cache import slug_caches
+from .fields import CachedSlugRelatedField
+from .timing import request_timings
 from .validators import UsernameValidationMixin
 
 User = get_user_model()
 
 
-class SignUpSerializer(serializers.Serializer, UsernameValidationMixin):
+class TimedSerializerMixin:
+    """Время валидации и сборки ответа попадает в Server-Timing."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        if type(serializer) is serializers.ListSerializer:
+            serializer.__class__ = TimedListSerializer
+        return serializer
+
+    def is_valid(self, *args, **kwargs):
+        timings = request_timings.get()
+        if timings is None:
+            return super().is_valid(*args, **kwargs)
+        with timings.measure('serializer'):
+            return super().is_valid(*args, **kwargs)
+
+    @property
+    def data(self):
+        timings = request_timings.get()
+        if timings is None:
+            return super().data
+        with timings.measure('serializer'):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class SparseFieldsMixin:
+    """Оставляет в сериализаторе только поля из аргумента fields."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SignUpSerializer(
+    TimedSerializerMixin,
+    serializers.Serializer,
+    UsernameValidationMixin
+):
     email = serializers.EmailField(max_length=MAX_LENGTH_EMAIL)
     username = serializers.CharField(max_length=MAX_NAME_FIELD_LENGTH)
 
@@ -52,25 +107,25 @@ class SignUpSerializer(serializers.Serializer, UsernameValidationMixin):
         confirmation_code = str(
             random.randint(CONFIRMATION_CODE_MIN, CONFIRMATION_CODE_MAX)
         )
-        user, created = User.objects.get_or_create(
-            username=username,
-            email=email,
-            defaults={'confirmation_code': confirmation_code}
-        )
-        if not created:
-            user.confirmation_code = confirmation_code
-            user.save()
-        send_mail(
-            subject='Код подтверждения',
-            message=f'Ваш код: {confirmation_code}',
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
+        with transaction.atomic():
+            user, _ = User.objects.get_or_create(
+                username=username, email=email
+            )
+            ConfirmationCode.objects.issue(user, confirmation_code)
+            # Письмо уйдёт после коммита, запрос его не ждёт.
+            enqueue_email(
+                subject='Код подтверждения',
+                body=f'Ваш код: {confirmation_code}',
+                to=user.email,
+            )
         return user
 
 
-class TokenSerializer(serializers.Serializer, UsernameValidationMixin):
+class TokenSerializer(
+    TimedSerializerMixin,
+    serializers.Serializer,
+    UsernameValidationMixin
+):
     username = serializers.CharField(
         max_length=MAX_NAME_FIELD_LENGTH
     )
@@ -79,27 +134,49 @@ class TokenSerializer(serializers.Serializer, UsernameValidationMixin):
     )
 
     def validate(self, data):
-        username = data.get('username')
-        confirmation_code = data.get('confirmation_code')
-        user = get_object_or_404(User, username=username)
-        if not user.confirmation_code:
+        user = get_object_or_404(
+            User.objects.select_related('confirmation'),
+            username=data.get('username')
+        )
+        try:
+            confirmation = user.confirmation
+        except ConfirmationCode.DoesNotExist:
             raise serializers.ValidationError(
                 'Код уже был использован или не запрошен'
             )
-        if user.confirmation_code != confirmation_code:
+        if confirmation.is_expired:
+            raise serializers.ValidationError(
+                'Срок действия кода истёк, запросите новый'
+            )
+        # Попытка засчитывается до сравнения кода: запрос сверх лимита
+        # отклоняется, даже если прочитал счётчик до чужой попытки.
+        if not ConfirmationCode.objects.filter(user=user).count_attempt(
+            getattr(settings, 'CONFIRMATION_CODE_MAX_ATTEMPTS', 5)
+        ):
+            raise serializers.ValidationError(
+                'Превышено число попыток, запросите новый код'
+            )
+        if not compare_digest(
+            confirmation.code.encode(), data['confirmation_code'].encode()
+        ):
             raise serializers.ValidationError('Неверный код подтверждения')
+        data['user'] = user
         return data
 
     def create(self, validated_data):
-        username = validated_data['username']
-        user = get_object_or_404(User, username=username)
-        user.confirmation_code = ''
-        user.save()
-        token = AccessToken.for_user(user)
-        return {'token': str(token)}
+        user = validated_data['user']
+        # Код одноразовый: из двух одновременных обменов пройдёт один.
+        deleted, _ = ConfirmationCode.objects.filter(
+            user=user, code=validated_data['confirmation_code']
+        ).delete()
+        if not deleted:
+            raise serializers.ValidationError(
+                'Код уже был использован или не запрошен'
+            )
+        return {'token': str(get_access_token(user))}
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = User
@@ -114,22 +191,25 @@ class UserMeSerializer(UserSerializer):
         read_only_fields = ('role',)
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ('name', 'slug')
 
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = ('name', 'slug')
 
 
-class TitleReadSerializer(serializers.ModelSerializer):
+class TitleReadSerializer(
+    TimedSerializerMixin,
+    SparseFieldsMixin,
+    serializers.ModelSerializer
+):
     genre = GenreSerializer(many=True, read_only=True)
     category = CategorySerializer(read_only=True)
-    rating = serializers.IntegerField()
 
     class Meta:
         model = Title
@@ -139,14 +219,62 @@ class TitleReadSerializer(serializers.ModelSerializer):
         )
 
 
-class TitleWriteSerializer(serializers.ModelSerializer):
-    genre = serializers.SlugRelatedField(
+class TitleListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """Список произведений из строк values() без полей DRF на каждую строку.
+
+    Выдаёт то же, что TitleReadSerializer(many=True); жанры всей страницы
+    забираются одним запросом. child нужен для схемы и browsable API.
+    """
+    # Поле ответа -> колонки values(); жанры приходят отдельным запросом.
+    values_fields = {
+        'id': ('id',),
+        'name': ('name',),
+        'year': ('year',),
+        'rating': ('rating',),
+        'description': ('description',),
+        'genre': (),
+        'category': ('category__name', 'category__slug'),
+    }
+    # Колонки сортировки нужны курсорной пагинации при любом ?fields=.
+    ordering_values_fields = ('id', 'name', 'year')
+
+    @classmethod
+    def get_values_fields(cls, fields):
+        columns = dict.fromkeys(cls.ordering_values_fields)
+        for field in fields:
+            columns.update(dict.fromkeys(cls.values_fields[field]))
+        return tuple(columns)
+
+    def to_representation(self, data):
+        rows = list(data)
+        fields = tuple(self.child.fields)
+        genres = defaultdict(list)
+        if 'genre' in fields:
+            for title_id, name, slug in (
+                TitleGenre.objects.filter(
+                    title_id__in=[row['id'] for row in rows]
+                )
+                .order_by('genre__name')
+                .values_list('title_id', 'genre__name', 'genre__slug')
+            ):
+                genres[title_id].append({'name': name, 'slug': slug})
+        for row in rows:
+            row['genre'] = genres[row['id']]
+            row['category'] = None if row.get('category__slug') is None else {
+                'name': row['category__name'],
+                'slug': row['category__slug'],
+            }
+        return [{field: row[field] for field in fields} for row in rows]
+
+
+class TitleWriteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    genre = CachedSlugRelatedField(
         slug_field='slug',
         queryset=Genre.objects.all(),
         many=True,
         allow_empty=False
     )
-    category = serializers.SlugRelatedField(
+    category = CachedSlugRelatedField(
         slug_field='slug',
         queryset=Category.objects.all()
     )
@@ -154,12 +282,51 @@ class TitleWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Title
         fields = ('id', 'name', 'year', 'description', 'genre', 'category')
+    slug_fields = ('genre', 'category')
+
+    def create(self, validated_data):
+        return self.save_checked(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self.save_checked(
+            partial(super().update, instance), validated_data
+        )
+
+    def save_checked(self, save, validated_data):
+        """Запись, где удалённый жанр или категория дают 400, а не 500.
+
+        Кеш slug мог вернуть строку, которую уже удалил другой процесс.
+        Нарушение внешнего ключа считается промахом кеша: кеш сбрасывается,
+        а slug проверяются по базе заново.
+        """
+        try:
+            with transaction.atomic():
+                return save(validated_data)
+        except IntegrityError:
+            for slug_cache in slug_caches.values():
+                slug_cache.clear()
+            errors = {}
+            for name in self.slug_fields:
+                field = self.fields[name]
+                try:
+                    field.run_validation(field.get_value(self.initial_data))
+                except SkipField:
+                    pass
+                except serializers.ValidationError as error:
+                    errors[name] = error.detail
+            if not errors:
+                raise
+            raise serializers.ValidationError(errors)
 
     def title_read(self, instance):
         return TitleReadSerializer(instance).data
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(
+    TimedSerializerMixin,
+    SparseFieldsMixin,
+    serializers.ModelSerializer
+):
     author = serializers.SlugRelatedField(
         slug_field='username',
         read_only=True,
@@ -170,22 +337,31 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ('id', 'text', 'author', 'score', 'pub_date',)
 
-    def validate(self, data):
-        if self.instance:
-            return data
-
-        title_id = self.context['view'].kwargs.get('title_id')
-        author = self.context['request'].user
-
-        if Review.objects.filter(title_id=title_id, author=author).exists():
-            raise serializers.ValidationError(
-                'Вы уже оставляли отзыв на это произведение.'
-            )
-
-        return data
-
-
-class CommentSerializer(serializers.ModelSerializer):
+    def create(self, validated_data):
+        # Повтор ловит ограничение unique-author-title, без лишнего SELECT.
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            # Другие нарушения, например удалённое тем временем
+            # произведение, за повторный отзыв не выдаются.
+            if not Review.objects.filter(
+                author=validated_data['author'],
+                title=validated_data['title'],
+            ).exists():
+                raise
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Вы уже оставляли отзыв на это произведение.'
+                ]
+            })
+
+
+class CommentSerializer(
+    TimedSerializerMixin,
+    SparseFieldsMixin,
+    serializers.ModelSerializer
+):
     author = serializers.SlugRelatedField(
         slug_field='username',
         read_only=True
@@ -0,0 +1,136 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+)
+from django.dispatch import receiver
+
+from reviews.models import (
+    Category,
+    Comment,
+    Genre,
+    Review,
+    Title,
+    TitleGenre,
+    User,
+)
+from reviews.signals import rows_loaded
+from .authentication import USER_RESOURCE, USERS_RESOURCE, user_cache
+from .cache import bump_versions, slug_caches
+from .slow_queries import get_slow_query_threshold, slow_query_log
+
+# Какие закешированные ответы устаревают при записи в модель.
+AFFECTED_RESOURCES = {
+    Category: ('categories', 'titles'),
+    Genre: ('genres', 'titles'),
+    Title: ('titles',),
+    TitleGenre: ('titles',),
+    Review: ('titles',),
+}
+
+
+# Общая версия вложенных списков: загрузка в обход save() сбрасывает их
+# все сразу, не собирая ключи родителей каждой строки.
+NESTED_RESOURCES = {
+    Review: 'reviews',
+    Comment: 'comments',
+}
+
+
+def bump_versions_on_commit(*resources):
+    # Версии меняются после коммита, иначе в кеш под новой версией
+    # попал бы ответ со старыми данными.
+    transaction.on_commit(partial(bump_versions, *resources))
+
+
+def bump_affected_versions(sender, **kwargs):
+    bump_versions_on_commit(*AFFECTED_RESOURCES[sender])
+
+
+for model in AFFECTED_RESOURCES:
+    post_save.connect(bump_affected_versions, sender=model)
+    post_delete.connect(bump_affected_versions, sender=model)
+
+
+@receiver((post_save, post_delete), sender=Category)
+@receiver((post_save, post_delete), sender=Genre)
+def clear_slug_cache(sender, **kwargs):
+    slug_caches[sender].clear()
+
+
+@receiver(m2m_changed, sender=TitleGenre)
+def bump_versions_on_genres_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_affected_versions(sender)
+
+
+@receiver((post_save, post_delete), sender=Review)
+def bump_title_reviews_version(sender, instance, **kwargs):
+    bump_versions_on_commit(f'reviews:{instance.title_id}')
+
+
+@receiver((post_save, post_delete), sender=Comment)
+def bump_review_comments_version(sender, instance, **kwargs):
+    bump_versions_on_commit(f'comments:{instance.review_id}')
+
+
+@receiver(post_delete, sender=Title)
+@receiver(post_delete, sender=Review)
+def bump_children_version(sender, instance, **kwargs):
+    # Вложенный список без строк не получает сигналов от каскада, а
+    # сохранённый ETag не должен давать 304 вместо 404.
+    prefix = 'reviews' if sender is Title else 'comments'
+    bump_versions_on_commit(f'{prefix}:{instance.pk}')
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_authors_version(sender, update_fields=None, **kwargs):
+    # Отзывы и комментарии показывают username автора.
+    if update_fields is None or 'username' in update_fields:
+        bump_versions_on_commit('authors')
+
+
+@receiver((post_save, post_delete), sender=User)
+def discard_cached_user(sender, instance, **kwargs):
+    user_cache.discard(instance.pk)
+    # Другие процессы увидят новую версию в общем кеше.
+    bump_versions_on_commit(USER_RESOURCE.format(instance.pk))
+
+
+@receiver(rows_loaded)
+def bump_versions_on_rows_loaded(sender, **kwargs):
+    resources = set(AFFECTED_RESOURCES.get(sender, ()))
+    if sender in NESTED_RESOURCES:
+        resources.add(NESTED_RESOURCES[sender])
+    elif sender is User:
+        resources.update(('authors', USERS_RESOURCE))
+        user_cache.clear()
+    if sender in slug_caches:
+        slug_caches[sender].clear()
+    if resources:
+        bump_versions_on_commit(*resources)
+
+
+@receiver(post_migrate)
+def bump_all_versions(sender, **kwargs):
+    # migrate и flush меняют данные в обход сигналов моделей.
+    user_cache.clear()
+    bump_versions('authors', USERS_RESOURCE, *NESTED_RESOURCES.values(), *{
+        resource
+        for resources in AFFECTED_RESOURCES.values()
+        for resource in resources
+    })
+
+
+@receiver(connection_created)
+def install_slow_query_log(sender, connection, **kwargs):
+    if (
+        get_slow_query_threshold() is not None
+        and slow_query_log not in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.append(slow_query_log)
@@ -0,0 +1,167 @@
+import logging
+import re
+import sys
+import threading
+from contextvars import ContextVar
+from hashlib import md5
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.db import NotSupportedError, transaction
+from rest_framework.views import APIView
+
+logger = logging.getLogger('api.slow_queries')
+
+API_DIR = str(Path(__file__).resolve().parent)
+# Сколько разных запросов помнит статистика процесса.
+MAX_FINGERPRINTS = 1000
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+SPACE_RE = re.compile(r'\s+')
+
+# Внутри EXPLAIN обёртка пропускает запросы сквозь себя.
+explaining = ContextVar('explaining', default=False)
+
+
+def get_slow_query_threshold():
+    """Порог медленного запроса в миллисекундах; None — журнал выключен."""
+    return getattr(settings, 'API_SLOW_QUERY_MS', None)
+
+
+def normalize_sql(sql):
+    """SQL без значений: одинаковые запросы с разными параметрами совпадут."""
+    sql = STRING_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return SPACE_RE.sub(' ', sql).replace('%s', '?').strip()
+
+
+def get_fingerprint(value):
+    return md5(value.encode()).hexdigest()[:12]
+
+
+def get_callers():
+    """Ближайший к запросу метод кода api и view, который его вызвал.
+
+    Например, ('TitleListSerializer.to_representation', 'TitleViewSet.list').
+    Стек разбирается только для медленных запросов.
+    """
+    source = view = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        owner = frame.f_locals.get('self')
+        if source is None and code.co_filename.startswith(API_DIR) and (
+            code.co_filename != __file__
+        ):
+            owner_class = owner or frame.f_locals.get('cls')
+            if owner_class is None:
+                source = f'{Path(code.co_filename).stem}.{code.co_name}'
+            else:
+                if not isinstance(owner_class, type):
+                    owner_class = type(owner_class)
+                source = f'{owner_class.__name__}.{code.co_name}'
+        if isinstance(owner, APIView) and hasattr(owner, 'request'):
+            view = f'{type(owner).__name__}.' + (
+                getattr(owner, 'action', None) or owner.request.method.lower()
+            )
+        frame = frame.f_back
+    return source, view
+
+
+class SlowQueryLog:
+    """execute_wrapper: пишет в лог запросы дольше API_SLOW_QUERY_MS.
+
+    Запись содержит нормализованный SQL, отпечатки SQL и параметров,
+    вызывающий метод api и план из EXPLAIN. План снимается один раз на
+    отпечаток, а статистика копится по отпечаткам в памяти процесса.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold = get_slow_query_threshold()
+        if threshold is None or explaining.get():
+            return execute(sql, params, many, context)
+        started = perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (perf_counter() - started) * 1000
+        if duration >= threshold:
+            self.record(sql, params, many, context, duration)
+        return result
+
+    def record(self, sql, params, many, context, duration):
+        normalized = normalize_sql(sql)
+        fingerprint = get_fingerprint(normalized)
+        source, view = get_callers()
+        with self.lock:
+            entry = self.stats.get(fingerprint)
+            if entry is None:
+                if len(self.stats) >= MAX_FINGERPRINTS:
+                    return
+                entry = self.stats[fingerprint] = {
+                    'fingerprint': fingerprint,
+                    'sql': normalized,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'callers': set(),
+                    'plan': None,
+                }
+            entry['count'] += 1
+            entry['total_ms'] += duration
+            entry['max_ms'] = max(entry['max_ms'], duration)
+            if view or source:
+                entry['callers'].add(
+                    ' из '.join(name for name in (source, view) if name)
+                )
+            needs_plan = entry['plan'] is None
+        if needs_plan and not many:
+            entry['plan'] = self.explain(context['connection'], sql, params)
+        logger.warning(
+            'Медленный запрос %.1f мс: %s\nотпечаток %s, параметры %s, '
+            'вызов %s из %s, всего %d раз за %.1f мс\nплан: %s',
+            duration, normalized, fingerprint, get_fingerprint(repr(params)),
+            source, view, entry['count'], entry['total_ms'], entry['plan'],
+        )
+
+    def explain(self, connection, sql, params):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return None
+        token = explaining.set(True)
+        try:
+            prefix = connection.ops.explain_query_prefix()
+            # Точка сохранения: ошибка EXPLAIN не ломает транзакцию запроса.
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(f'{prefix} {sql}', params)
+                    rows = cursor.fetchall()
+            # У SQLite в последнем столбце описание шага плана.
+            if connection.vendor == 'sqlite':
+                return '\n'.join(str(row[-1]) for row in rows)
+            return '\n'.join(' '.join(map(str, row)) for row in rows)
+        except (NotSupportedError, connection.Database.Error) as error:
+            return f'не удалось получить: {error}'
+        finally:
+            explaining.reset(token)
+
+    def get_stats(self):
+        """Отпечатки по убыванию суммарного времени."""
+        with self.lock:
+            entries = [
+                {**entry, 'callers': sorted(entry['callers'])}
+                for entry in self.stats.values()
+            ]
+        return sorted(entries, key=lambda entry: -entry['total_ms'])
+
+    def clear(self):
+        with self.lock:
+            self.stats.clear()
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,108 @@
+import time
+from abc import ABC, abstractmethod
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import metrics_registry
+
+BUCKET_KEY = 'api:throttle:{}:{}:{}'
+# Блокировка корзины: сколько раз и с какой паузой пытаться её взять и
+# через сколько секунд она снимается сама, если процесс упал.
+LOCK_RETRIES = 20
+LOCK_RETRY_DELAY = 0.001
+LOCK_TIMEOUT = 1
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def get_throttle_rates():
+    """Лимиты вида '20/min' по типу ключа; без типа — без лимита."""
+    return getattr(settings, 'API_THROTTLE_RATES', {})
+
+
+def parse_rate(rate):
+    """'20/min' -> (20, 60): ёмкость корзины и время её наполнения."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def acquire_lock(key):
+    """Берёт блокировку в кеше: add атомарен и в Redis, и в LocMemCache."""
+    for _ in range(LOCK_RETRIES):
+        if cache.add(key, 1, timeout=LOCK_TIMEOUT):
+            return True
+        time.sleep(LOCK_RETRY_DELAY)
+    return False
+
+
+class TokenBucketThrottle(ABC, BaseThrottle):
+    """Корзина токенов в кеше на каждую пару (view, ключ запроса).
+
+    При лимите '20/min' корзина вмещает 20 запросов и пополняется на один
+    каждые 3 секунды. Проверка идёт в initial() view, до разбора данных
+    сериализатором и до запросов к базе. Чтение, расчёт и запись корзины
+    идут под блокировкой в том же кеше, поэтому процессы с общим кешем не
+    превышают лимит вместе. Кто не дождался блокировки, получает 429:
+    столько параллельных запросов с одним ключом лимит всё равно исчерпают.
+    """
+
+    kind = None
+
+    @abstractmethod
+    def get_key(self, request):
+        """Строка, по которой считается лимит; None — без лимита."""
+
+    def allow_request(self, request, view):
+        rate = get_throttle_rates().get(self.kind)
+        if rate is None:
+            return True
+        key = self.get_key(request)
+        if key is None:
+            return True
+        capacity, period = parse_rate(rate)
+        refill = capacity / period
+        bucket_key = BUCKET_KEY.format(
+            type(view).__name__, self.kind, md5(key.encode()).hexdigest()
+        )
+        lock_key = f'{bucket_key}:lock'
+        if not acquire_lock(lock_key):
+            self.wait_seconds = 1 / refill
+            metrics_registry.increment('throttled_requests', self.kind)
+            return False
+        try:
+            # Время стенное: корзина в общем кеше видна всем процессам.
+            now = time.time()
+            tokens, updated = cache.get(bucket_key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            cache.set(bucket_key, (tokens, now), timeout=period)
+        finally:
+            cache.delete(lock_key)
+        if allowed:
+            return True
+        self.wait_seconds = (1 - tokens) / refill
+        metrics_registry.increment('throttled_requests', self.kind)
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    kind = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class UsernameThrottle(TokenBucketThrottle):
+    kind = 'username'
+
+    def get_key(self, request):
+        data = request.data
+        username = data.get('username') if hasattr(data, 'get') else None
+        return None if username is None else str(username)
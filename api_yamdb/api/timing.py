@@ -0,0 +1,59 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+# Замеры текущего запроса; None — замеры выключены.
+request_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Время частей одного запроса в секундах и число SQL-запросов.
+
+    Экземпляр подключается к соединениям через execute_wrapper и считает
+    запросы к базе вместе с их временем.
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.queries = 0
+        self.active = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def measure(self, name):
+        """Добавляет время блока к name.
+
+        Вложенный замер того же name, например сериализатор внутри
+        сериализатора, второй раз не считается.
+        """
+        if name in self.active:
+            yield
+            return
+        self.active.add(name)
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += perf_counter() - started
+            self.active.discard(name)
+
+    def get_server_timing(self):
+        """Значение заголовка Server-Timing, длительности в миллисекундах."""
+        metrics = [
+            f'db;dur={self.durations["db"] * 1000:.1f};'
+            f'desc="{self.queries} queries"'
+        ]
+        metrics.extend(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in self.durations.items()
+            if name != 'db'
+        )
+        return ', '.join(metrics)
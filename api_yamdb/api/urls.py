@@ -9,7 +9,8 @@ from .views import (
     SignUpView,
     TokenView,
     ReviewViewSet,
-    CommentViewSet
+    CommentViewSet,
+    metrics
 )
 
 v1_router = DefaultRouter()
@@ -38,4 +39,5 @@ v1_urlpatterns = [
 
 urlpatterns = [
     path('v1/', include((v1_urlpatterns, 'v1'))),
+    path('metrics/', metrics, name='metrics'),
 ]
@@ -1,10 +1,12 @@
+from secrets import compare_digest
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Avg
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, filters, mixins
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
@@ -16,6 +18,14 @@ from rest_framework.permissions import (
 )
 
 from .filters import TitleFilter
+from .metrics import metrics_registry, render_metrics
+from .mixins import (
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    SparseFieldsetMixin,
+    TimedViewMixin
+)
+from .pagination import PageNumberOrCursorPagination
 from .permissions import (
     AdminRole,
     IsAdminOrReadOnly,
@@ -25,11 +35,13 @@ from reviews.models import (
     Category,
     Genre,
     Title,
-    Review
+    Review,
+    Comment
 )
 from .serializers import (
     CategorySerializer,
     GenreSerializer,
+    TitleListSerializer,
     TitleReadSerializer,
     TitleWriteSerializer,
     SignUpSerializer,
@@ -39,12 +51,30 @@ from .serializers import (
     CommentSerializer,
     UserMeSerializer
 )
+from .throttling import IPThrottle, UsernameThrottle
 
 User = get_user_model()
 
 
-class SignUpView(APIView):
+def metrics(request):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    if not getattr(settings, 'API_METRICS_ENABLED', False):
+        raise Http404
+    token = getattr(settings, 'API_METRICS_TOKEN', None)
+    if not token or not compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f'Bearer {token}'.encode()
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(*metrics_registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+class SignUpView(TimedViewMixin, APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (IPThrottle, UsernameThrottle)
 
     def post(self, request):
         serializer = SignUpSerializer(data=request.data)
@@ -53,17 +83,19 @@ class SignUpView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class TokenView(APIView):
+class TokenView(TimedViewMixin, APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (IPThrottle, UsernameThrottle)
 
     def post(self, request):
         serializer = TokenSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # save() возвращает {'token': ...}, а не объект с полями
+        # сериализатора.
+        return Response(serializer.save(), status=status.HTTP_200_OK)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(TimedViewMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     lookup_field = 'username'
@@ -89,6 +121,9 @@ class UserViewSet(viewsets.ModelViewSet):
 
 
 class BaseCategoryGenreViewSet(
+    TimedViewMixin,
+    ConditionalGetMixin,
+    CachedResponseMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.DestroyModelMixin,
@@ -104,21 +139,28 @@ class BaseCategoryGenreViewSet(
 class CategoryViewSet(BaseCategoryGenreViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_resources = ('categories',)
 
 
 class GenreViewSet(BaseCategoryGenreViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
+    cache_resources = ('genres',)
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(
+    TimedViewMixin,
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    SparseFieldsetMixin,
+    viewsets.ModelViewSet
+):
     queryset = (
         Title.objects.select_related('category')
         .prefetch_related('genre')
-        .annotate(rating=Avg('reviews__score'))
         .order_by('-year', 'name')
     )
-    pagination_class = PageNumberPagination
+    pagination_class = PageNumberOrCursorPagination
     permission_classes = (IsAdminOrReadOnly,)
     filter_backends = (
         DjangoFilterBackend,
@@ -129,6 +171,37 @@ class TitleViewSet(viewsets.ModelViewSet):
     filterset_class = TitleFilter
     ordering_fields = ('name', 'year')
     http_method_names = ('get', 'post', 'patch', 'delete')
+    cache_resources = ('titles',)
+    sparse_defer = {
+        'description': ('description',),
+        'rating': ('rating', 'rating_sum', 'rating_count'),
+    }
+    sparse_select_related = {'category': 'category'}
+    sparse_prefetch_related = {'genre': 'genre'}
+
+    def get_queryset(self):
+        return self.prune_queryset(super().get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        return self.handle_read(self.list_rows, request, *args, **kwargs)
+
+    def list_rows(self, request, *args, **kwargs):
+        """list через values() и TitleListSerializer."""
+        child = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.prefetch_related(None).values(
+            *TitleListSerializer.get_values_fields(child.fields)
+        )
+        page = self.paginate_queryset(rows)
+        serializer = TitleListSerializer(
+            rows if page is None else page, child=child
+        )
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.handle_read(super().retrieve, request, *args, **kwargs)
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от типа запроса"""
@@ -137,20 +210,46 @@ class TitleViewSet(viewsets.ModelViewSet):
         return TitleWriteSerializer
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(
+    TimedViewMixin,
+    ConditionalGetMixin,
+    SparseFieldsetMixin,
+    viewsets.ModelViewSet
+):
     serializer_class = ReviewSerializer
-    pagination_class = PageNumberPagination
+    pagination_class = PageNumberOrCursorPagination
     permission_classes = (
         IsAuthenticatedOrReadOnly,
         IsAuthorModeratorAdminOrReadOnly,
     )
     http_method_names = ('get', 'post', 'patch', 'delete')
+    sparse_defer = {'text': ('text',)}
+    sparse_select_related = {'author': 'author'}
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.handle_read(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_resources(self):
+        return ('reviews', f'reviews:{self.kwargs["title_id"]}', 'authors')
 
     def get_title(self):
-        return get_object_or_404(Title, pk=self.kwargs['title_id'])
+        if not hasattr(self, '_title'):
+            self._title = get_object_or_404(Title, pk=self.kwargs['title_id'])
+        return self._title
 
     def get_queryset(self):
-        return self.get_title().reviews.all()
+        return self.prune_queryset(
+            Review.objects.filter(
+                title_id=self.kwargs['title_id']
+            ).select_related('author')
+        )
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if not page:
+            # Пустая страница: 404, если самого произведения нет.
+            self.get_title()
+        return page
 
     def perform_create(self, serializer):
         serializer.save(
@@ -159,24 +258,53 @@ class ReviewViewSet(viewsets.ModelViewSet):
         )
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(
+    TimedViewMixin,
+    ConditionalGetMixin,
+    SparseFieldsetMixin,
+    viewsets.ModelViewSet
+):
     serializer_class = CommentSerializer
-    pagination_class = PageNumberPagination
+    pagination_class = PageNumberOrCursorPagination
     permission_classes = (
         IsAuthenticatedOrReadOnly,
         IsAuthorModeratorAdminOrReadOnly,
     )
     http_method_names = ('get', 'post', 'patch', 'delete')
+    sparse_defer = {'text': ('text',)}
+    sparse_select_related = {'author': 'author'}
 
-    def get_review(self):
-        return get_object_or_404(
-            Review,
-            pk=self.kwargs['review_id'],
-            title=self.kwargs['title_id'],
+    def retrieve(self, request, *args, **kwargs):
+        return self.handle_read(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_resources(self):
+        return (
+            'comments', f'comments:{self.kwargs["review_id"]}', 'authors'
         )
 
+    def get_review(self):
+        if not hasattr(self, '_review'):
+            self._review = get_object_or_404(
+                Review,
+                pk=self.kwargs['review_id'],
+                title=self.kwargs['title_id'],
+            )
+        return self._review
+
     def get_queryset(self):
-        return self.get_review().comments.all()
+        return self.prune_queryset(
+            Comment.objects.filter(
+                review_id=self.kwargs['review_id'],
+                review__title_id=self.kwargs['title_id'],
+            ).select_related('author')
+        )
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if not page:
+            # Пустая страница: 404, если самого отзыва нет.
+            self.get_review()
+        return page
 
     def perform_create(self, serializer):
         serializer.save(
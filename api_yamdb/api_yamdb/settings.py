@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -25,6 +26,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +62,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLite не знает SELECT ... FOR UPDATE: транзакция сразу берёт
+        # блокировку записи, и чтения перед записью не устаревают.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
@@ -99,16 +105,41 @@ EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
 
 DEFAULT_FROM_EMAIL = 'from@example.com'
 
+# Письма идут через таблицу исходящих. 'thread' — отправка фоновым потоком
+# после коммита, 'sync' — в том же запросе после коммита, 'worker' — только
+# командой send_emails. Неудачные попытки повторяются через RETRY_DELAY,
+# 2 * RETRY_DELAY, ... секунд, пока не кончатся MAX_ATTEMPTS.
+EMAIL_OUTBOX_DELIVERY = 'thread'
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60
+
+# Код подтверждения действует LIFETIME и выдерживает MAX_ATTEMPTS неверных
+# попыток; истёкшие коды удаляет команда clear_confirmation_codes.
+CONFIRMATION_CODE_LIFETIME = timedelta(days=1)
+CONFIRMATION_CODE_MAX_ATTEMPTS = 5
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Сколько доверенных прокси стоит перед сервером. IP клиента для лимитов
+    # берётся из X-Forwarded-For только за ними, без прокси — REMOTE_ADDR.
+    'NUM_PROXIES': int(os.getenv('API_NUM_PROXIES', 0)),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
@@ -116,6 +147,80 @@ REST_FRAMEWORK = {
     ],
 }
 
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'rest_framework.renderers.BrowsableAPIRenderer'
+    )
+
+# Общий для всех процессов кеш. Без него у каждого процесса свой
+# LocMemCache, и запись в одном процессе не сбрасывает кеш ответов других.
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Время жизни закешированных GET-ответов каталога, 0 — кеш выключен.
+# Включается только с общим кешем.
+API_RESPONSE_CACHE_TIMEOUT = 300 if REDIS_URL else 0
+
+# ETag и Last-Modified ответов каталога и ответы 304 на них. Строятся по
+# версиям ресурсов в кеше, поэтому тоже включаются только с общим кешем.
+API_CONDITIONAL_GET = bool(REDIS_URL)
+
+# Сколько секунд процесс помнит жанры и категории по slug для записи
+# произведений, 0 — кеш выключен. Удаление в другом процессе видно только
+# через общий кеш, поэтому без него кеш выключен.
+API_SLUG_CACHE_TIMEOUT = 60 if REDIS_URL else 0
+
+# Заголовок Server-Timing с временем базы, проверок доступа, view и
+# сериализации; X-Query-Count — число SQL-запросов. Выключенные ничего
+# не стоят.
+API_SERVER_TIMING = False
+API_QUERY_COUNT_HEADER = False
+
+# Запросы дольше порога (мс) пишутся в лог api.slow_queries с планом
+# EXPLAIN; None — журнал выключен.
+API_SLOW_QUERY_MS = None
+
+# Метрики запросов по view для /api/metrics/ в текстовом формате
+# Prometheus. Процессы раз в API_METRICS_FLUSH_INTERVAL секунд пишут свои
+# счётчики в API_METRICS_DIR, а эндпоинт их складывает; без каталога
+# видны только метрики отвечающего процесса.
+API_METRICS_ENABLED = False
+API_METRICS_DIR = None
+API_METRICS_FLUSH_INTERVAL = 1
+# Эндпоинт отвечает только на Authorization: Bearer <токен>; без токена
+# он закрыт для всех.
+API_METRICS_TOKEN = os.getenv('API_METRICS_TOKEN')
+
+# Пользователи из JWT живут в LRU процесса: сколько и сколько секунд.
+# Роль в токене и версия пользователя в кеше сверяются при каждом
+# запросе, 0 секунд — кеш выключен. Версии видны всем процессам только в
+# общем кеше, поэтому без него кеш выключен: иначе понижение роли или
+# блокировка в одном процессе не доходили бы до других до 60 секунд.
+API_AUTH_USER_CACHE_SIZE = 1024
+API_AUTH_USER_CACHE_TIMEOUT = 60 if REDIS_URL else 0
+
+# Лимиты регистрации и получения токена: корзины токенов в кеше отдельно
+# на каждый IP и на каждый username. Лишние запросы получают 429 до
+# обращения к базе; удалённый тип ключа снимает его лимит. Общим для
+# процессов лимит будет только с общим кешем (REDIS_URL).
+API_THROTTLE_RATES = {
+    'ip': '20/min',
+    'username': '5/min',
+}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
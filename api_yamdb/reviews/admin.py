@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
-from .models import Review, Comment, Category, Genre, Title, User
+from .models import (
+    Review, Comment, Category, Genre, Title, User, OutgoingEmail,
+    ConfirmationCode
+)
 
 
 @admin.register(User)
@@ -13,7 +16,7 @@ class UserAdmin(BaseUserAdmin):
     search_fields = ('username', 'email', 'first_name', 'last_name')
     list_filter = ('role',)
     fieldsets = BaseUserAdmin.fieldsets + (
-        (None, {'fields': ('role', 'bio', 'confirmation_code')}),
+        (None, {'fields': ('role', 'bio')}),
     )
     add_fieldsets = (
         (None, {
@@ -76,10 +79,24 @@ class GenreAdmin(admin.ModelAdmin):
 @admin.register(Title)
 class TitleAdmin(admin.ModelAdmin):
     list_display = ('name', 'year', 'category', 'display_genres',
-                    'description')
+                    'rating', 'description')
     search_fields = ('name', 'category__name', 'genre__name')
     list_filter = ('category', 'genre', 'year')
 
     @admin.display(description='Жанры')
     def display_genres(self, obj):
         return ', '.join([genre.name for genre in obj.genre.all()])
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'created', 'sent', 'attempts')
+    search_fields = ('to', 'subject')
+    list_filter = ('sent', 'attempts')
+
+
+@admin.register(ConfirmationCode)
+class ConfirmationCodeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'expires', 'attempts')
+    search_fields = ('user__username', 'user__email')
+    raw_id_fields = ('user',)
@@ -18,3 +18,4 @@ STR_LIMIT = 20
 CONFIRMATION_CODE_LENGTH = 6
 CONFIRMATION_CODE_MIN = 100000
 CONFIRMATION_CODE_MAX = 999999
+MAX_EMAIL_SUBJECT_LENGTH = 255
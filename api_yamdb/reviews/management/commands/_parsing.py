@@ -0,0 +1,70 @@
+"""Разбор CSV для load_csv.
+
+Модуль не импортирует Django: его загружают рабочие процессы
+load_csv --jobs, которым нужен только разбор строк.
+"""
+import csv
+import datetime
+
+ROWS = 'rows'
+ERROR = 'error'
+FAILED = 'failed'
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def parse_value(key, value, int_fields, foreign_keys):
+    """Поля модели из ячейки CSV; foreign_keys: столбец -> поле *_id."""
+    if key == 'pub_date':
+        return {key: datetime.datetime.strptime(
+            value, DATE_FORMAT
+        ).replace(tzinfo=datetime.timezone.utc)}
+    if key in int_fields:
+        return {key: int(value)}
+    if key in foreign_keys:
+        return {foreign_keys[key]: int(value)}
+    return {key: value}
+
+
+def read_batches(file_path, batch_size, int_fields, foreign_keys):
+    """Результаты разбора файла по порядку.
+
+    (ROWS, [(номер строки, поля), ...]) — пачка до batch_size строк,
+    (ERROR, (номер строки, [ошибки])) — пропущенная строка.
+    """
+    with open(file_path, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        batch = []
+        for row in reader:
+            fields = {}
+            row_errors = []
+            for key, value in row.items():
+                try:
+                    fields.update(
+                        parse_value(key, value, int_fields, foreign_keys)
+                    )
+                except ValueError as error:
+                    row_errors.append(f'столбец {key}: {error}')
+            if row_errors:
+                yield ERROR, (reader.line_num, row_errors)
+                continue
+            batch.append((reader.line_num, fields))
+            if len(batch) >= batch_size:
+                yield ROWS, batch
+                batch = []
+        if batch:
+            yield ROWS, batch
+
+
+def parse_file(queue, *args):
+    """Тело рабочего процесса: результаты read_batches, затем None.
+
+    Исключение разбора передаётся как (FAILED, исключение), чтобы его
+    подняла основная команда.
+    """
+    try:
+        for item in read_batches(*args):
+            queue.put(item)
+    except Exception as error:
+        queue.put((FAILED, error))
+    queue.put(None)
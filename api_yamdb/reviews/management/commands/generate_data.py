@@ -0,0 +1,340 @@
+import csv
+import datetime
+import os
+import random
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reviews.constants import ADMIN, MODERATOR, USER
+from reviews.models import (
+    User, Category, Genre, Title, Review, Comment, TitleGenre
+)
+from reviews.signals import rows_loaded
+from ._parsing import DATE_FORMAT
+from .load_csv import Command as LoadCommand, keep_pub_date
+
+CATEGORY_NAMES = (
+    'Фильм', 'Книга', 'Музыка', 'Сериал', 'Игра', 'Спектакль', 'Комикс',
+    'Подкаст', 'Мультфильм', 'Опера',
+)
+GENRE_NAMES = (
+    'Драма', 'Комедия', 'Триллер', 'Ужасы', 'Фантастика', 'Фэнтези',
+    'Детектив', 'Мелодрама', 'Вестерн', 'Приключения', 'Документальный',
+    'Рок', 'Джаз', 'Классика', 'Шансон', 'Поэзия', 'Сказка', 'Боевик',
+)
+ADJECTIVES = (
+    'Тихий', 'Последний', 'Красный', 'Зелёный', 'Северный', 'Далёкий',
+    'Ночной', 'Потерянный', 'Старый', 'Золотой', 'Снежный', 'Бесконечный',
+)
+NOUNS = (
+    'дом', 'берег', 'город', 'сад', 'поезд', 'остров', 'лес', 'путь',
+    'океан', 'свет', 'ветер', 'маяк', 'мост', 'сон',
+)
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', '')
+LAST_NAMES = ('Иванова', 'Петров', 'Смирнова', 'Кузнецов', 'Попова', '')
+WORDS = (
+    'сюжет', 'актёры', 'музыка', 'финал', 'герой', 'впечатление', 'очень',
+    'совсем', 'неожиданно', 'слабо', 'сильно', 'красиво', 'скучно',
+    'понравился', 'разочаровал', 'стоит', 'посмотреть', 'прочитать', 'снова',
+    'местами', 'затянуто', 'атмосфера', 'диалоги', 'идея', 'автор', 'конец',
+)
+# Отзывы и комментарии появляются в этом интервале: с фиксированными
+# границами данные не зависят от даты запуска.
+PERIOD_START = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+PERIOD_END = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+PERIOD_SECONDS = int((PERIOD_END - PERIOD_START).total_seconds())
+COMMENT_DELAY_SECONDS = 30 * 24 * 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует воспроизводимый набор данных заданного размера: '
+        'в CSV для load_csv или прямо в пустую БД'
+    )
+
+    # Столбцы CSV в формате static/data.
+    csv_columns = {
+        User: (
+            'id', 'username', 'email', 'role', 'bio', 'first_name',
+            'last_name',
+        ),
+        Category: ('id', 'name', 'slug'),
+        Genre: ('id', 'name', 'slug'),
+        Title: ('id', 'name', 'year', 'category'),
+        Review: ('id', 'title_id', 'text', 'author', 'score', 'pub_date'),
+        Comment: ('id', 'review_id', 'text', 'author', 'pub_date'),
+        TitleGenre: ('id', 'title_id', 'genre_id'),
+    }
+    counts = {
+        'users': 1000,
+        'categories': 10,
+        'genres': 30,
+        'titles': 10000,
+        'reviews': 100000,
+        'comments': 100000,
+    }
+
+    def add_arguments(self, parser):
+        for name, default in self.counts.items():
+            parser.add_argument(
+                f'--{name}', type=int, default=default,
+                help=f'Сколько создать ({default} по умолчанию).'
+            )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: с одним зерном данные одинаковы.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Показатель закона Ципфа для популярности; 0 — равномерно.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Каталог для CSV; без него данные пишутся в БД.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять в БД за один раз.'
+        )
+
+    def handle(self, *args, **kwargs):
+        self.counts = {name: kwargs[name] for name in self.counts}
+        self.rng = random.Random(kwargs['seed'])
+        self.seed = kwargs['seed']
+        self.skew = kwargs['skew']
+        self.batch_size = kwargs['batch_size']
+        if min(self.counts.values()) < 0 or self.batch_size < 1:
+            raise CommandError('Размеры должны быть неотрицательными.')
+        if self.counts['titles'] and not (
+            self.counts['categories'] and self.counts['genres']
+        ):
+            raise CommandError('Произведениям нужны категории и жанры.')
+        if self.counts['reviews'] > (
+            self.counts['titles'] * self.counts['users']
+        ):
+            raise CommandError(
+                'Отзывов больше, чем пар пользователь—произведение.'
+            )
+        if self.counts['comments'] and not (
+            self.counts['reviews'] and self.counts['users']
+        ):
+            raise CommandError('Комментариям нужны отзывы и пользователи.')
+        # Пул предложений: собирать текст из слов на каждую строку долго.
+        self.sentences = [
+            ' '.join(self.rng.choices(WORDS, k=self.rng.randint(4, 12)))
+            .capitalize() + '.'
+            for _ in range(1000)
+        ]
+        generators = (
+            (User, self.generate_users),
+            (Category, self.generate_categories),
+            (Genre, self.generate_genres),
+            (Title, self.generate_titles),
+            (TitleGenre, self.generate_title_genres),
+            (Review, self.generate_reviews),
+            (Comment, self.generate_comments),
+        )
+        if not kwargs['output'] and any(
+            model.objects.exists() for model, _ in generators
+        ):
+            raise CommandError(
+                'База не пуста, а строки пишутся с заданными id: очистите '
+                'её командой flush или укажите --output.'
+            )
+        for model, generate in generators:
+            started = time.monotonic()
+            if kwargs['output']:
+                written = self.write_csv(model, generate(), kwargs['output'])
+            else:
+                written = self.write_db(model, generate())
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{model._meta.object_name}: {written} строк за '
+                f'{elapsed:.1f} с '
+                f'({written / elapsed if elapsed else 0:.0f} строк/с).'
+            )
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы!'))
+
+    def write_csv(self, model, rows, output):
+        os.makedirs(output, exist_ok=True)
+        columns = self.csv_columns[model]
+        # Столбец CSV -> поле модели, как их сопоставляет load_csv.
+        attnames = [
+            LoadCommand.foreign_keys.get(column, (None, column))[1]
+            for column in columns
+        ]
+        file_path = os.path.join(output, LoadCommand.models_files[model])
+        written = 0
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                if 'pub_date' in row:
+                    row['pub_date'] = row['pub_date'].strftime(DATE_FORMAT)
+                writer.writerow([row[attname] for attname in attnames])
+                written += 1
+        return written
+
+    def write_db(self, model, rows):
+        written = 0
+        with transaction.atomic(), keep_pub_date():
+            while batch := list(islice(rows, self.batch_size)):
+                model.objects.bulk_create([model(**row) for row in batch])
+                written += len(batch)
+            if written:
+                rows_loaded.send(sender=model)
+        if model == Review:
+            Title.objects.refresh_ratings()
+        return written
+
+    def zipf_index(self, size):
+        """Номер от 0 до size - 1 с вероятностью ~ 1 / (номер + 1) ** skew.
+
+        Обратная функция распределения непрерывного приближения закона
+        Ципфа: не требует таблицы весов, сколько бы ни было элементов.
+        """
+        exponent = 1 - self.skew
+        if exponent == 0:
+            rank = (size + 1) ** self.rng.random()
+        else:
+            rank = (
+                1 + self.rng.random() * ((size + 1) ** exponent - 1)
+            ) ** (1 / exponent)
+        return min(int(rank), size) - 1
+
+    def make_text(self):
+        return ' '.join(self.rng.choices(
+            self.sentences, k=self.rng.randint(1, 4)
+        ))
+
+    def review_date(self, review_id):
+        """pub_date отзыва по его id: комментарий найдёт её без таблицы."""
+        offset = (review_id * 2654435761 + self.seed) % PERIOD_SECONDS
+        return PERIOD_START + datetime.timedelta(seconds=offset)
+
+    def generate_users(self):
+        for user_id in range(1, self.counts['users'] + 1):
+            chance = self.rng.random()
+            yield {
+                'id': user_id,
+                'username': f'user{user_id}',
+                'email': f'user{user_id}@yamdb.fake',
+                'role': (
+                    ADMIN if chance < 0.001
+                    else MODERATOR if chance < 0.01
+                    else USER
+                ),
+                'bio': self.make_text() if chance < 0.2 else '',
+                'first_name': self.rng.choice(FIRST_NAMES),
+                'last_name': self.rng.choice(LAST_NAMES),
+            }
+
+    def generate_names(self, names, count, slug_prefix):
+        for item_id in range(1, count + 1):
+            name = names[(item_id - 1) % len(names)]
+            if item_id > len(names):
+                name = f'{name} {(item_id - 1) // len(names) + 1}'
+            yield {
+                'id': item_id,
+                'name': name,
+                'slug': f'{slug_prefix}-{item_id}',
+            }
+
+    def generate_categories(self):
+        return self.generate_names(
+            CATEGORY_NAMES, self.counts['categories'], 'category'
+        )
+
+    def generate_genres(self):
+        return self.generate_names(
+            GENRE_NAMES, self.counts['genres'], 'genre'
+        )
+
+    def generate_titles(self):
+        last_year = PERIOD_END.year
+        for title_id in range(1, self.counts['titles'] + 1):
+            yield {
+                'id': title_id,
+                'name': (
+                    f'{self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)}'
+                ),
+                # Новых произведений больше, чем старых.
+                'year': max(
+                    1900, last_year - int(self.rng.expovariate(1 / 15))
+                ),
+                'category_id': self.zipf_index(self.counts['categories']) + 1,
+            }
+
+    def generate_title_genres(self):
+        genres_count = self.counts['genres']
+        link_id = 0
+        for title_id in range(1, self.counts['titles'] + 1):
+            size = min(self.rng.randint(1, 3), genres_count)
+            genre_ids = set()
+            while len(genre_ids) < size:
+                genre_ids.add(self.zipf_index(genres_count) + 1)
+            for genre_id in sorted(genre_ids):
+                link_id += 1
+                yield {
+                    'id': link_id,
+                    'title_id': title_id,
+                    'genre_id': genre_id,
+                }
+
+    def generate_reviews(self):
+        """Отзывы по произведениям: число отзывов убывает с id по Ципфу.
+
+        Доли считаются с переносом остатка, поэтому отзывов ровно
+        counts['reviews'], а у произведения их не больше, чем
+        пользователей: авторы одного произведения не повторяются.
+        """
+        users_count = self.counts['users']
+        titles_count = self.counts['titles']
+        weights_sum = sum(
+            rank ** -self.skew for rank in range(1, titles_count + 1)
+        )
+        remaining = self.counts['reviews']
+        carry = 0.0
+        review_id = 0
+        for title_id in range(1, titles_count + 1):
+            carry += self.counts['reviews'] * title_id ** -self.skew / (
+                weights_sum
+            )
+            # Оставшимся произведениям должно хватить мест под остаток.
+            floor = remaining - (titles_count - title_id) * users_count
+            size = min(max(int(carry), floor), users_count, remaining)
+            carry -= size
+            remaining -= size
+            quality = self.rng.gauss(7, 1.5)
+            for author_id in self.rng.sample(
+                range(1, users_count + 1), size
+            ):
+                review_id += 1
+                yield {
+                    'id': review_id,
+                    'title_id': title_id,
+                    'text': self.make_text(),
+                    'author_id': author_id,
+                    'score': min(10, max(1, round(
+                        self.rng.gauss(quality, 2)
+                    ))),
+                    'pub_date': self.review_date(review_id),
+                }
+
+    def generate_comments(self):
+        reviews_count = self.counts['reviews']
+        for comment_id in range(1, self.counts['comments'] + 1):
+            # Популярные отзывы — отзывы на популярные произведения.
+            review_id = self.zipf_index(reviews_count) + 1
+            yield {
+                'id': comment_id,
+                'review_id': review_id,
+                'text': self.make_text(),
+                'author_id': self.zipf_index(self.counts['users']) + 1,
+                'pub_date': self.review_date(review_id) + datetime.timedelta(
+                    seconds=self.rng.randrange(COMMENT_DELAY_SECONDS)
+                ),
+            }
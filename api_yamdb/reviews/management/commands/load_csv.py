@@ -1,64 +1,354 @@
 import os
-import csv
-import datetime
+import multiprocessing
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from graphlib import TopologicalSorter
+from queue import Empty
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import connection, transaction
 
 from reviews.models import (
     User, Category, Genre, Title, Review, Comment, TitleGenre
 )
+from reviews.signals import rows_loaded
+from ._parsing import ERROR, FAILED, parse_file, read_batches
+
+
+@contextmanager
+def keep_pub_date():
+    """Отключает auto_now_add, чтобы bulk_create сохранил pub_date строк."""
+    fields = [model._meta.get_field('pub_date') for model in (Review, Comment)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def without_query_log():
+    """Не пишет запросы загрузки в connection.queries даже при DEBUG.
+
+    Для этого лога SQLite-бэкенд экранирует параметры каждого запроса
+    отдельным SELECT QUOTE(...), и на bulk_create по тысяче строк это
+    около трети времени загрузки. Явный захват запросов (тесты) не
+    отключается.
+    """
+    if connection.force_debug_cursor:
+        yield
+        return
+    connection.make_debug_cursor = connection.make_cursor
+    try:
+        yield
+    finally:
+        del connection.make_debug_cursor
 
 
 class Command(BaseCommand):
     help = 'Загружает данные из CSV файлов в БД'
 
+    models_files = {
+        User: 'users.csv',
+        Category: 'category.csv',
+        Genre: 'genre.csv',
+        Title: 'titles.csv',
+        Review: 'review.csv',
+        Comment: 'comments.csv',
+        TitleGenre: 'genre_title.csv',
+    }
+    # Столбец CSV -> (модель, на которую он ссылается, поле *_id).
+    foreign_keys = {
+        'category': (Category, 'category_id'),
+        'title_id': (Title, 'title_id'),
+        'author': (User, 'author_id'),
+        'review_id': (Review, 'review_id'),
+        'genre_id': (Genre, 'genre_id'),
+    }
+    int_fields = ('id', 'year', 'score')
+    # Сколько разобранных пачек рабочий процесс держит впереди вставки.
+    queue_batches = 4
+    # Как часто, в секундах, проверять, что процесс разбора ещё жив.
+    queue_timeout = 1
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data-dir',
+            default=os.path.join(settings.BASE_DIR, 'static/data'),
+            help='Каталог с CSV файлами.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк читать и вставлять за один раз.'
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1,
+            help='Сколько файлов разбирать параллельно в отдельных '
+                 'процессах. Ускоряет только разбор CSV: проверка связей и '
+                 'вставка идут в основном процессе.'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Добавлять новые строки и обновлять изменённые по id '
+                 'вместо вставки в пустую базу.'
+        )
+
     def handle(self, *args, **kwargs):
-        data_path = os.path.join(settings.BASE_DIR, 'static/data')
-        models_files = {
-            User: 'users.csv',
-            Category: 'category.csv',
-            Genre: 'genre.csv',
-            Title: 'titles.csv',
-            Review: 'review.csv',
-            Comment: 'comments.csv',
-            TitleGenre: 'genre_title.csv',
+        self.data_path = kwargs['data_dir']
+        self.batch_size = kwargs['batch_size']
+        self.verbosity = kwargs['verbosity']
+        self.upsert = kwargs['upsert']
+        self.errors = 0
+        if self.batch_size < 1 or kwargs['jobs'] < 1:
+            raise CommandError('--batch-size и --jobs должны быть больше 0.')
+        parsed_files = self.iter_parsed_files(
+            self.get_load_order(), kwargs['jobs']
+        )
+        for model, items in parsed_files:
+            self.load_file(model, items, self.models_files[model])
+        if self.errors:
+            self.stdout.write(self.style.WARNING(
+                f'Данные загружены, пропущено строк с ошибками: '
+                f'{self.errors}.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS('Данные успешно загружены!'))
+
+    def get_load_order(self):
+        """Модели в порядке вставки: каждая — после тех, на кого ссылается.
+
+        Граф строится по внешним ключам моделей; независимые файлы идут в
+        порядке models_files.
+        """
+        position = list(self.models_files).index
+        sorter = TopologicalSorter({
+            model: {
+                field.related_model
+                for field in model._meta.concrete_fields
+                if field.is_relation
+                and field.related_model in self.models_files
+            }
+            for model in self.models_files
+        })
+        sorter.prepare()
+        order = []
+        while sorter.is_active():
+            ready = sorted(sorter.get_ready(), key=position)
+            order.extend(ready)
+            sorter.done(*ready)
+        return order
+
+    def get_parse_args(self, model):
+        return (
+            os.path.join(self.data_path, self.models_files[model]),
+            self.batch_size,
+            self.int_fields,
+            {key: attname for key, (_, attname) in self.foreign_keys.items()},
+        )
+
+    def iter_parsed_files(self, order, jobs):
+        """Пары (модель, результаты разбора её файла) в порядке вставки.
+
+        При jobs > 1 файлы разбираются в рабочих процессах, не более jobs
+        одновременно, и опережают вставку не больше чем на queue_batches
+        пачек. Вставка остаётся в этом процессе и идёт по порядку.
+        """
+        if jobs == 1:
+            for model in order:
+                yield model, read_batches(*self.get_parse_args(model))
+            return
+        context = multiprocessing.get_context('spawn')
+        pending = deque(order)
+        workers = {}
+        try:
+            for model in order:
+                while pending and sum(
+                    process.is_alive() for process, _ in workers.values()
+                ) < jobs:
+                    queued_model = pending.popleft()
+                    queue = context.Queue(maxsize=self.queue_batches)
+                    process = context.Process(
+                        target=parse_file,
+                        args=(queue, *self.get_parse_args(queued_model)),
+                        daemon=True,
+                    )
+                    process.start()
+                    workers[queued_model] = (process, queue)
+                process, queue = workers[model]
+                yield model, self.read_queue(
+                    process, queue, self.models_files[model]
+                )
+                workers.pop(model)
+                process.join()
+        finally:
+            for process, _ in workers.values():
+                process.terminate()
+
+    def read_queue(self, process, queue, filename):
+        """Результаты разбора из очереди рабочего процесса до None.
+
+        Если процесс завершился, не дописав очередь (убит, упал
+        интерпретатор), поднимает CommandError вместо вечного ожидания.
+        """
+        while True:
+            # Всё, что процесс записал до выхода, уже лежит в очереди.
+            alive = process.is_alive()
+            try:
+                item = queue.get(timeout=self.queue_timeout)
+            except Empty:
+                if alive:
+                    continue
+                raise CommandError(
+                    f'{filename}: процесс разбора завершился с кодом '
+                    f'{process.exitcode}, не дочитав файл.'
+                )
+            if item is None:
+                return
+            yield item
+
+    def load_file(self, model, items, filename):
+        """Загружает файл пачками по batch_size строк в одной транзакции.
+
+        В памяти одновременно держится только текущая пачка, поэтому
+        потребление памяти не зависит от размера файла. Для отзывов
+        копятся id произведений, чей рейтинг надо пересчитать.
+        """
+        # Связи дублируются при повторной загрузке: их отсекает
+        # ограничение unique_title_genre.
+        ignore_conflicts = model == TitleGenre
+        loaded = 0
+        stats = Counter()
+        rated_titles = set()
+        started = time.monotonic()
+        with transaction.atomic(), keep_pub_date(), without_query_log():
+            count_before = model.objects.count() if ignore_conflicts else 0
+            for kind, payload in items:
+                if kind == FAILED:
+                    raise payload
+                if kind == ERROR:
+                    self.report_error(filename, *payload)
+                    continue
+                rows = list(self.check_foreign_keys(payload, filename))
+                if not rows:
+                    continue
+                created, updated, previous = self.save_rows(
+                    model, rows, ignore_conflicts
+                )
+                if model == Review:
+                    # previous: прежнее произведение перенесённых отзывов.
+                    rated_titles.update(
+                        row['title_id']
+                        for row in (*created, *updated, *previous)
+                    )
+                loaded += len(rows)
+                stats['created'] += len(created)
+                stats['updated'] += len(updated)
+                if self.verbosity > 1:
+                    self.report_progress(filename, loaded, started)
+            if ignore_conflicts:
+                stats['created'] = model.objects.count() - count_before
+            if stats['created'] or stats['updated']:
+                rows_loaded.send(sender=model)
+            self.refresh_ratings(rated_titles)
+        self.report_progress(filename, loaded, started)
+        if self.upsert or ignore_conflicts:
+            self.stdout.write(
+                f'{filename}: новых {stats["created"]}, '
+                f'обновлено {stats["updated"]}, без изменений '
+                f'{loaded - stats["created"] - stats["updated"]}.'
+            )
+
+    def save_rows(self, model, rows, ignore_conflicts):
+        """Записывает пачку: (созданные, обновлённые, прежние строки)."""
+        if self.upsert:
+            return self.upsert_rows(model, rows, ignore_conflicts)
+        model.objects.bulk_create(
+            [model(**fields) for fields in rows],
+            ignore_conflicts=ignore_conflicts
+        )
+        return rows, [], []
+
+    def upsert_rows(self, model, rows, ignore_conflicts):
+        """Создаёт новые строки пачки и обновляет изменённые.
+
+        Текущие значения читаются одним запросом id__in; строки, которые
+        совпадают с базой, не записываются. Возвращает созданные строки,
+        обновлённые и их значения в базе до обновления.
+        """
+        fields = [name for name in rows[0] if name != 'id']
+        existing = {
+            row['id']: row
+            for row in model.objects.filter(
+                id__in=[row['id'] for row in rows]
+            ).values('id', *fields)
         }
-        foreign_keys = {
-            'category': (Category, 'category'),
-            'title_id': (Title, 'title'),
-            'author': (User, 'author'),
-            'review_id': (Review, 'review'),
+        created = [row for row in rows if row['id'] not in existing]
+        updated = [
+            row for row in rows
+            if row['id'] in existing and existing[row['id']] != row
+        ]
+        model.objects.bulk_create(
+            [model(**row) for row in created],
+            ignore_conflicts=ignore_conflicts
+        )
+        model.objects.bulk_update([model(**row) for row in updated], fields)
+        return created, updated, [existing[row['id']] for row in updated]
+
+    def refresh_ratings(self, title_ids):
+        """Пересчитывает рейтинг произведений пачками по batch_size id."""
+        title_ids = sorted(title_ids)
+        for start in range(0, len(title_ids), self.batch_size):
+            Title.objects.filter(
+                pk__in=title_ids[start:start + self.batch_size]
+            ).refresh_ratings()
+
+    def report_progress(self, filename, loaded, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{filename}: {loaded} строк за {elapsed:.1f} с '
+            f'({loaded / elapsed if elapsed else 0:.0f} строк/с).'
+        )
+
+    def check_foreign_keys(self, batch, filename):
+        """Поля строк пачки, все внешние ключи которых есть в базе.
+
+        Существование проверяется одним запросом id__in на столбец и пачку,
+        а не набором всех id таблицы, который рос бы вместе с ней.
+        """
+        columns = [
+            (key, model_class, attname)
+            for key, (model_class, attname) in self.foreign_keys.items()
+            if attname in batch[0][1]
+        ]
+        existing = {
+            attname: set(model_class.objects.filter(
+                id__in={fields[attname] for _, fields in batch}
+            ).values_list('id', flat=True))
+            for _, model_class, attname in columns
         }
-        for model, filename in models_files.items():
-            file_path = os.path.join(data_path, filename)
-            with open(file_path, encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                objects = []
-                if model == TitleGenre:
-                    for row in reader:
-                        title_id = int(row['title_id'])
-                        genre_id = int(row['genre_id'])
-                        TitleGenre.objects.get_or_create(
-                            title_id=title_id, genre_id=genre_id
-                        )
-                    continue
-                for row in reader:
-                    fields = {}
-                    for key, value in row.items():
-                        if key == 'pub_date':
-                            fields[key] = datetime.datetime.strptime(
-                                value, '%Y-%m-%dT%H:%M:%S.%fZ'
-                            )
-                        elif key in ['id', 'year', 'score']:
-                            fields[key] = int(value)
-                        elif key in foreign_keys:
-                            model_class, field_name = foreign_keys[key]
-                            fields[field_name] = model_class.objects.get(
-                                id=int(value)
-                            )
-                        else:
-                            fields[key] = value
-                    objects.append(model(**fields))
-                model.objects.bulk_create(objects)
-        self.stdout.write(self.style.SUCCESS('Данные успешно загружены!'))
+        for line_num, fields in batch:
+            row_errors = [
+                f'столбец {key}: {model_class._meta.object_name} '
+                f'с id={fields[attname]} не найден'
+                for key, model_class, attname in columns
+                if fields[attname] not in existing[attname]
+            ]
+            if row_errors:
+                self.report_error(filename, line_num, row_errors)
+                continue
+            yield fields
+
+    def report_error(self, filename, line_num, row_errors):
+        self.errors += 1
+        self.stderr.write(
+            f'{filename}, строка {line_num}: ' + '; '.join(row_errors)
+        )
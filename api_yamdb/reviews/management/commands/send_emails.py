@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди исходящих пачками через одно '
+        'соединение; с --loop работает как постоянный обработчик'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько писем забирать за раз (EMAIL_OUTBOX_BATCH_SIZE).'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а проверять очередь каждые --interval.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Пауза между проверками очереди в секундах.'
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        if batch_size is not None and batch_size < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+        while True:
+            sent, failed = deliver_pending(batch_size)
+            if sent or failed or not kwargs['loop']:
+                self.stdout.write(
+                    f'Отправлено {sent}, отложено до повтора {failed}'
+                )
+            if not kwargs['loop']:
+                return
+            time.sleep(kwargs['interval'])
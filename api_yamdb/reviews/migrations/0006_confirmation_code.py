@@ -0,0 +1,60 @@
+# Generated by Django 5.1.1 on 2026-10-18 04:02
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copy_codes(apps, schema_editor):
+    User = apps.get_model('reviews', 'User')
+    ConfirmationCode = apps.get_model('reviews', 'ConfirmationCode')
+    # Старые коды не истекали: им отводится полный срок от миграции.
+    expires = timezone.now() + getattr(
+        settings, 'CONFIRMATION_CODE_LIFETIME', timedelta(days=1)
+    )
+    ConfirmationCode.objects.bulk_create(
+        ConfirmationCode(user_id=user_id, code=code, expires=expires)
+        for user_id, code in User.objects.exclude(
+            confirmation_code__isnull=True
+        ).exclude(confirmation_code='').values_list('id', 'confirmation_code')
+    )
+
+
+def restore_codes(apps, schema_editor):
+    User = apps.get_model('reviews', 'User')
+    ConfirmationCode = apps.get_model('reviews', 'ConfirmationCode')
+    for user_id, code in ConfirmationCode.objects.values_list(
+        'user_id', 'code'
+    ):
+        User.objects.filter(id=user_id).update(confirmation_code=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfirmationCode',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='confirmation', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('code', models.CharField(max_length=6, verbose_name='Код')),
+                ('expires', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Неудачных попыток')),
+            ],
+            options={
+                'verbose_name': 'Код подтверждения',
+                'verbose_name_plural': 'Коды подтверждения',
+            },
+        ),
+        migrations.RunPython(copy_codes, restore_codes),
+        migrations.RemoveField(
+            model_name='user',
+            name='confirmation_code',
+        ),
+    ]
@@ -1,4 +1,10 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import (
     MinValueValidator, MaxValueValidator
@@ -19,7 +25,8 @@ from .constants import (
     MAX_LEN_NAME,
     MAX_LEN_SLUG,
     MAX_LEN_TITLE_NAME,
-    CONFIRMATION_CODE_LENGTH
+    CONFIRMATION_CODE_LENGTH,
+    MAX_EMAIL_SUBJECT_LENGTH
 )
 
 
@@ -59,11 +66,6 @@ class User(AbstractUser):
         default=USER,
         choices=ROLE_CHOICES
     )
-    confirmation_code = models.CharField(
-        'Код подтверждения',
-        max_length=CONFIRMATION_CODE_LENGTH,
-        null=True,
-        blank=True)
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -116,6 +118,49 @@ class Genre(NameSlugBase):
         verbose_name_plural = 'Жанры'
 
 
+class TitleQuerySet(models.QuerySet):
+
+    def change_rating(self, score_delta, count_delta=0):
+        """Атомарно сдвигает сумму и количество оценок произведений."""
+        return self.update(
+            rating_sum=F('rating_sum') + score_delta,
+            rating_count=F('rating_count') + count_delta,
+            rating=Case(
+                When(rating_count=-count_delta, then=None),
+                default=(
+                    (F('rating_sum') + score_delta)
+                    / (F('rating_count') + count_delta)
+                ),
+                output_field=models.PositiveSmallIntegerField(),
+            ),
+        )
+
+    def refresh_ratings(self):
+        """Пересчитывает рейтинг по отзывам, например после bulk_create."""
+        reviews = (
+            Review.objects.filter(title=OuterRef('pk'))
+            .order_by()
+            .values('title')
+        )
+        self.update(
+            rating_sum=Coalesce(
+                Subquery(reviews.annotate(total=Sum('score')).values('total')),
+                0
+            ),
+            rating_count=Coalesce(
+                Subquery(reviews.annotate(total=Count('pk')).values('total')),
+                0
+            ),
+        )
+        return self.update(
+            rating=Case(
+                When(rating_count=0, then=None),
+                default=F('rating_sum') / F('rating_count'),
+                output_field=models.PositiveSmallIntegerField(),
+            )
+        )
+
+
 class Title(models.Model):
     name = models.CharField(
         'Название произведения',
@@ -145,11 +190,35 @@ class Title(models.Model):
         blank=True,
         verbose_name='Категория'
     )
+    rating_sum = models.PositiveIntegerField(
+        'Сумма оценок',
+        default=0,
+        editable=False
+    )
+    rating_count = models.PositiveIntegerField(
+        'Количество оценок',
+        default=0,
+        editable=False
+    )
+    rating = models.PositiveSmallIntegerField(
+        'Рейтинг',
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    objects = TitleQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Произведение'
         verbose_name_plural = 'Произведения'
         ordering = ('-year', 'name')
+        indexes = (
+            models.Index(
+                fields=('-year', 'name', 'id'),
+                name='title_year_name_id_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name[:STR_LIMIT]
@@ -211,9 +280,52 @@ class Review(TextAuthorDateModel):
                 name='unique-author-title'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('title', 'pub_date', 'id'),
+                name='review_title_pub_date_id_idx'
+            ),
+        )
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_rating_state()
+        return instance
+
+    def remember_rating_state(self):
+        """Запоминает оценку, уже учтённую в рейтинге произведения."""
+        self._rated_title_id = self.__dict__.get('title_id')
+        self._rated_score = self.__dict__.get('score')
+
+    def lock_rating_state(self):
+        """Перечитывает из базы под блокировкой строки учтённую оценку.
+
+        Дельта рейтинга считается от неё, а не от значения в памяти:
+        иначе два одновременных изменения отзыва сдвинули бы рейтинг от
+        одной и той же старой оценки.
+        """
+        self._rated_title_id, self._rated_score = (
+            Review.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list('title_id', 'score')
+            .first()
+        ) or (None, None)
+
+    def save(self, *args, **kwargs):
+        # Рейтинг обновляется в post_save, внутри той же транзакции.
+        with transaction.atomic():
+            if not self._state.adding:
+                self.lock_rating_state()
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.lock_rating_state()
+            return super().delete(*args, **kwargs)
+
 
 class Comment(TextAuthorDateModel):
     review = models.ForeignKey(
@@ -223,5 +335,101 @@ class Comment(TextAuthorDateModel):
     )
 
     class Meta(TextAuthorDateModel.Meta):
+        indexes = (
+            models.Index(
+                fields=('review', 'pub_date', 'id'),
+                name='comment_review_pub_date_id_idx'
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди на отправку; пишется в транзакции запроса."""
+
+    subject = models.CharField('Тема', max_length=MAX_EMAIL_SUBJECT_LENGTH)
+    body = models.TextField('Текст')
+    from_email = models.EmailField('Отправитель', max_length=MAX_LENGTH_EMAIL)
+    to = models.EmailField('Получатель', max_length=MAX_LENGTH_EMAIL)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    send_after = models.DateTimeField(
+        'Отправить после', default=timezone.now
+    )
+    sent = models.DateTimeField('Отправлено', null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        ordering = ('send_after', 'id')
+        indexes = (
+            models.Index(
+                fields=('sent', 'send_after', 'id'),
+                name='email_sent_send_after_id_idx'
+            ),
+        )
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+
+    def __str__(self):
+        return f'{self.to}: {self.subject[:STR_LIMIT]}'
+
+
+class ConfirmationCodeQuerySet(models.QuerySet):
+
+    def issue(self, user, code):
+        """Новый код пользователя одним INSERT ... ON CONFLICT UPDATE."""
+        lifetime = getattr(
+            settings, 'CONFIRMATION_CODE_LIFETIME', timedelta(days=1)
+        )
+        self.bulk_create(
+            [self.model(
+                user=user, code=code, expires=timezone.now() + lifetime
+            )],
+            update_conflicts=True,
+            unique_fields=('user',),
+            update_fields=('code', 'expires', 'attempts'),
+        )
+
+    def expired(self):
+        return self.filter(expires__lte=timezone.now())
+
+    def count_attempt(self, max_attempts):
+        """Засчитывает попытку, если лимит не исчерпан; 0 — исчерпан.
+
+        Проверка и увеличение идут одним UPDATE, поэтому параллельные
+        запросы не получат попыток сверх лимита.
+        """
+        return self.filter(attempts__lt=max_attempts).update(
+            attempts=F('attempts') + 1
+        )
+
+
+class ConfirmationCode(models.Model):
+    """Одноразовый код для получения токена; строка удаляется при обмене."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='confirmation',
+        verbose_name='Пользователь'
+    )
+    code = models.CharField('Код', max_length=CONFIRMATION_CODE_LENGTH)
+    expires = models.DateTimeField('Действует до', db_index=True)
+    attempts = models.PositiveSmallIntegerField(
+        'Неудачных попыток', default=0
+    )
+
+    objects = ConfirmationCodeQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Код подтверждения'
+        verbose_name_plural = 'Коды подтверждения'
+
+    def __str__(self):
+        return f'{self.user} до {self.expires:%Y-%m-%d %H:%M}'
+
+    @property
+    def is_expired(self):
+        return self.expires <= timezone.now()
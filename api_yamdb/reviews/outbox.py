@@ -0,0 +1,191 @@
+"""Очередь исходящих писем: запись в транзакции и отправка после коммита.
+
+Запрос только добавляет строку OutgoingEmail. После коммита письма
+отправляет фоновый поток процесса, сам запрос (EMAIL_OUTBOX_DELIVERY =
+'sync') или только команда send_emails ('worker'). Неудачные письма
+откладываются с экспоненциальной задержкой, и их дошлёт следующая
+отправка или команда send_emails.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger('reviews.outbox')
+
+# На столько отправитель забирает пачку: другие её не трогают.
+LEASE = timedelta(minutes=5)
+
+
+def get_outbox_setting(name, default):
+    return getattr(settings, f'EMAIL_OUTBOX_{name}', default)
+
+
+def enqueue_email(subject, body, to, from_email=None):
+    """Ставит письмо в очередь; отправка — после коммита транзакции."""
+    email = OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=to,
+    )
+    transaction.on_commit(schedule_delivery)
+    return email
+
+
+def schedule_delivery():
+    mode = get_outbox_setting('DELIVERY', 'thread')
+    if mode == 'sync':
+        deliver_pending()
+    elif mode == 'thread':
+        background_delivery.request()
+
+
+def claim_batch(batch_size):
+    """Забирает пачку готовых к отправке писем, продлевая их send_after.
+
+    Условный UPDATE не даёт двум отправителям забрать одно письмо даже
+    там, где нет SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    now = timezone.now()
+    ids = list(OutgoingEmail.objects.filter(
+        sent__isnull=True,
+        send_after__lte=now,
+        attempts__lt=get_outbox_setting('MAX_ATTEMPTS', 5),
+    ).values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    lease = now + LEASE
+    OutgoingEmail.objects.filter(
+        id__in=ids, sent__isnull=True, send_after__lte=now
+    ).update(send_after=lease)
+    return list(OutgoingEmail.objects.filter(id__in=ids, send_after=lease))
+
+
+def defer(email, error, now):
+    """Откладывает неудачное письмо с экспоненциальной задержкой."""
+    email.last_error = repr(error)
+    email.send_after = now + timedelta(
+        seconds=get_outbox_setting('RETRY_DELAY', 60)
+        * 2 ** (email.attempts - 1)
+    )
+
+
+def save_attempts(emails):
+    OutgoingEmail.objects.bulk_update(
+        emails, ('attempts', 'sent', 'send_after', 'last_error')
+    )
+
+
+def send_batch(emails, connection):
+    now = timezone.now()
+    for email in emails:
+        message = EmailMessage(
+            subject=email.subject,
+            body=email.body,
+            from_email=email.from_email,
+            to=[email.to],
+            connection=connection,
+        )
+        email.attempts += 1
+        try:
+            message.send()
+        except Exception as error:
+            # Одно недоставленное письмо не должно останавливать пачку.
+            defer(email, error, now)
+            logger.warning(
+                'Письмо %s не отправлено (попытка %d): %r',
+                email.id, email.attempts, error
+            )
+        else:
+            email.sent = now
+            email.last_error = ''
+    save_attempts(emails)
+
+
+def fail_batch(emails, error):
+    """Засчитывает неудачную попытку всей пачке: соединения нет."""
+    now = timezone.now()
+    for email in emails:
+        email.attempts += 1
+        defer(email, error, now)
+    save_attempts(emails)
+    logger.warning(
+        'Почтовый сервер недоступен, отложено писем: %d: %r',
+        len(emails), error
+    )
+
+
+def deliver_pending(batch_size=None):
+    """Отправляет все готовые письма пачками через одно соединение.
+
+    Если соединение не открывается, забранная пачка откладывается как
+    неудачная попытка, а остальные письма ждут следующей отправки.
+    Возвращает число отправленных и отложенных писем.
+    """
+    batch_size = batch_size or get_outbox_setting('BATCH_SIZE', 100)
+    sent = failed = 0
+    connection = None
+    try:
+        while emails := claim_batch(batch_size):
+            if connection is None:
+                try:
+                    connection = get_connection()
+                    connection.open()
+                except Exception as error:
+                    connection = None
+                    fail_batch(emails, error)
+                    failed += len(emails)
+                    break
+            send_batch(emails, connection)
+            delivered = sum(email.sent is not None for email in emails)
+            sent += delivered
+            failed += len(emails) - delivered
+    finally:
+        if connection is not None:
+            connection.close()
+    return sent, failed
+
+
+class BackgroundDelivery:
+    """Один фоновый поток на процесс, который разбирает очередь писем.
+
+    Запросы, пришедшие пока отправка ещё не началась, сливаются в одну.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.executor = None
+
+    def request(self):
+        with self.lock:
+            if self.scheduled:
+                return
+            self.scheduled = True
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='email-outbox'
+                )
+        self.executor.submit(self.run)
+
+    def run(self):
+        with self.lock:
+            # Письма, добавленные после этого места, запросят новый проход.
+            self.scheduled = False
+        try:
+            deliver_pending()
+        except Exception:
+            logger.exception('Ошибка фоновой отправки писем')
+        finally:
+            close_old_connections()
+
+
+background_delivery = BackgroundDelivery()
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import Review, Title
+
+# Строки модели записаны в обход save(), например командой load_csv.
+# Шлётся один раз на файл, внутри его транзакции; sender — модель.
+rows_loaded = Signal()
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, **kwargs):
+    old_title_id = getattr(instance, '_rated_title_id', None)
+    old_score = getattr(instance, '_rated_score', None)
+    if created:
+        Title.objects.filter(pk=instance.title_id).change_rating(
+            instance.score, 1
+        )
+    elif old_title_id is None or old_score is None:
+        # Неизвестно, что уже учтено в рейтинге: считаем заново.
+        Title.objects.filter(
+            pk__in=(instance.title_id, old_title_id)
+        ).refresh_ratings()
+    elif old_title_id != instance.title_id:
+        Title.objects.filter(pk=old_title_id).change_rating(-old_score, -1)
+        Title.objects.filter(pk=instance.title_id).change_rating(
+            instance.score, 1
+        )
+    elif old_score != instance.score:
+        Title.objects.filter(pk=instance.title_id).change_rating(
+            instance.score - old_score
+        )
+    instance.remember_rating_state()
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    title_id = getattr(instance, '_rated_title_id', None)
+    score = getattr(instance, '_rated_score', None)
+    if title_id is None or score is None:
+        # Строки уже не было или оценка не загружена: считаем заново.
+        Title.objects.filter(pk=instance.title_id).refresh_ratings()
+    else:
+        Title.objects.filter(pk=title_id).change_rating(-score, -1)
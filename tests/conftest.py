@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 
@@ -29,3 +31,15 @@ if FILENAME not in project_dir_content:
 pytest_plugins = [
     'tests.fixtures.fixture_user',
 ]
+
+
+@pytest.fixture(autouse=True)
+def synchronous_email_outbox(settings):
+    # Письма отправляются сразу после коммита, тесты читают mail.outbox.
+    settings.EMAIL_OUTBOX_DELIVERY = 'sync'
+
+
+@pytest.fixture(autouse=True)
+def no_throttling(settings):
+    # Лимиты запросов проверяются отдельно, в test_14_throttling.
+    settings.API_THROTTLE_RATES = {}
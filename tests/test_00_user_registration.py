@@ -274,6 +274,33 @@ class Test00UserRegistration:
             ', возвращает ответ со статусом 400.'
         )
 
+    def test_00_obtain_jwt_token_valid_data(self, client):
+        valid_data = {
+            'email': 'valid@yamdb.fake',
+            'username': 'valid_username'
+        }
+        client.post(self.URL_SIGNUP, data=valid_data)
+        confirmation_code = mail.outbox[-1].body.split()[-1]
+        token_data = {
+            'username': valid_data['username'],
+            'confirmation_code': confirmation_code
+        }
+        response = client.post(self.URL_TOKEN, data=token_data)
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что POST-запрос с корректными `username` и '
+            f'`confirmation_code`, отправленный на эндпоинт `{self.URL_TOKEN}`'
+            ', возвращает ответ со статусом 200.'
+        )
+        assert 'token' in response.json(), (
+            f'Проверьте, что ответ эндпоинта `{self.URL_TOKEN}` содержит '
+            'JWT-токен в поле `token`.'
+        )
+
+        response = client.post(self.URL_TOKEN, data=token_data)
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что код подтверждения нельзя использовать повторно.'
+        )
+
     def test_00_registration_me_username_restricted(self, client):
         valid_data = {
             'email': 'valid@yamdb.fake',
@@ -0,0 +1,467 @@
+import time
+from http import HTTPStatus
+
+import pytest
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from api.authentication import USER_RESOURCE, get_access_token, user_cache
+from api.cache import bump_versions, slug_caches
+from api.renderers import FastJSONRenderer
+from api.serializers import (
+    ReviewSerializer, TimedSerializerMixin, TitleReadSerializer
+)
+from api.slow_queries import slow_query_log
+from api.timing import RequestTimings, request_timings
+from reviews.models import Comment, Genre, Review, Title
+from tests.utils import create_categories, create_genre, create_titles
+
+PAGE_SIZE = 10
+
+
+def create_thread(django_user_model, authors_count):
+    title = Title.objects.create(name='Солярис', year=1972)
+    authors = [
+        django_user_model.objects.create_user(
+            username=f'author{idx}', email=f'author{idx}@yamdb.fake'
+        )
+        for idx in range(authors_count)
+    ]
+    reviews = [
+        Review.objects.create(
+            title=title, author=author, text='Отзыв', score=idx % 10 + 1
+        )
+        for idx, author in enumerate(authors)
+    ]
+    for author in authors:
+        Comment.objects.create(
+            review=reviews[0], author=author, text='Комментарий'
+        )
+    return title, reviews[0]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test08QueryCount:
+    REVIEWS_URL_TEMPLATE = '/api/v1/titles/{title_id}/reviews/'
+    COMMENTS_URL_TEMPLATE = (
+        '/api/v1/titles/{title_id}/reviews/{review_id}/comments/'
+    )
+    # Count и выборка страницы вместе с авторами; родитель — в том же JOIN.
+    LIST_QUERIES = 2
+
+    @pytest.mark.parametrize('authors_count', (2, PAGE_SIZE))
+    def test_01_review_list_queries(self, client, django_user_model,
+                                    django_assert_num_queries,
+                                    authors_count):
+        title, _ = create_thread(django_user_model, authors_count)
+        url = self.REVIEWS_URL_TEMPLATE.format(title_id=title.id)
+
+        with django_assert_num_queries(self.LIST_QUERIES):
+            response = client.get(url)
+
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.json()['results']) == authors_count, (
+            f'Проверьте, что GET-запрос к `{self.REVIEWS_URL_TEMPLATE}` '
+            'возвращает все отзывы на произведение.'
+        )
+
+    @pytest.mark.parametrize('authors_count', (2, PAGE_SIZE))
+    def test_02_comment_list_queries(self, client, django_user_model,
+                                     django_assert_num_queries,
+                                     authors_count):
+        title, review = create_thread(django_user_model, authors_count)
+        url = self.COMMENTS_URL_TEMPLATE.format(
+            title_id=title.id, review_id=review.id
+        )
+
+        with django_assert_num_queries(self.LIST_QUERIES):
+            response = client.get(url)
+
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.json()['results']) == authors_count, (
+            f'Проверьте, что GET-запрос к `{self.COMMENTS_URL_TEMPLATE}` '
+            'возвращает все комментарии к отзыву.'
+        )
+
+    def test_03_empty_list_of_missing_parent(self, client):
+        response = client.get(self.REVIEWS_URL_TEMPLATE.format(title_id=1))
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            f'Проверьте, что GET-запрос к `{self.REVIEWS_URL_TEMPLATE}` для '
+            'несуществующего произведения возвращает ответ со статусом 404.'
+        )
+        response = client.get(
+            self.COMMENTS_URL_TEMPLATE.format(title_id=1, review_id=1)
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            f'Проверьте, что GET-запрос к `{self.COMMENTS_URL_TEMPLATE}` для '
+            'несуществующего отзыва возвращает ответ со статусом 404.'
+        )
+
+    def test_04_title_post_slug_lookups(self, admin_client, settings):
+        settings.API_SLUG_CACHE_TIMEOUT = 60
+        genres = [genre['slug'] for genre in create_genre(admin_client)]
+        category = create_categories(admin_client)[0]['slug']
+        queries = []
+        for genre_slugs in (genres, genres[:1], genres):
+            with CaptureQueriesContext(connection) as context:
+                response = admin_client.post('/api/v1/titles/', data={
+                    'name': 'Сталкер',
+                    'year': 1979,
+                    'genre': genre_slugs,
+                    'category': category,
+                })
+            assert response.status_code == HTTPStatus.CREATED
+            queries.append([
+                query['sql'] for query in context.captured_queries
+                if 'FROM "reviews_genre" WHERE' in query['sql']
+                or 'FROM "reviews_category" WHERE' in query['sql']
+            ])
+        assert len(queries[0]) <= 2, (
+            'Проверьте, что все slug жанров разрешаются одним запросом.'
+        )
+        assert queries[1] == queries[2] == [], (
+            'Проверьте, что известные slug жанров и категорий берутся из '
+            'кеша без запросов к базе.'
+        )
+
+    def test_05_title_list_matches_read_serializer(self, client,
+                                                   admin_client, user_client):
+        titles, _, _ = create_titles(admin_client)
+        Title.objects.create(name='Без категории', year=2001)
+        user_client.post(
+            f'/api/v1/titles/{titles[0]["id"]}/reviews/',
+            data={'text': 'Отзыв', 'score': 9}
+        )
+        expected = TitleReadSerializer(
+            Title.objects.select_related('category').prefetch_related(
+                'genre'
+            ).order_by('-year', 'name'),
+            many=True
+        ).data
+
+        response = client.get('/api/v1/titles/')
+
+        assert response.content == FastJSONRenderer().render({
+            'count': len(expected),
+            'next': None,
+            'previous': None,
+            'results': expected,
+        }), (
+            'Проверьте, что список `/api/v1/titles/` побайтно совпадает с '
+            'выводом `TitleReadSerializer`.'
+        )
+
+    def test_06_sparse_fieldsets(self, client, admin_client,
+                                 django_user_model):
+        titles, _, _ = create_titles(admin_client)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                '/api/v1/titles/', {'fields': 'id,name,rating'}
+            )
+        assert response.status_code == HTTPStatus.OK
+        assert [
+            set(title) for title in response.json()['results']
+        ] == [{'id', 'name', 'rating'}] * len(titles), (
+            'Проверьте, что `?fields=` оставляет в ответе только '
+            'перечисленные поля.'
+        )
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        assert 'description' not in sql and 'reviews_genre' not in sql, (
+            'Проверьте, что `?fields=` убирает из запроса ненужные колонки '
+            'и подгрузку жанров.'
+        )
+
+        title, _ = create_thread(django_user_model, 2)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                self.REVIEWS_URL_TEMPLATE.format(title_id=title.id),
+                {'omit': 'text,author'}
+            )
+        assert set(response.json()['results'][0]) == {
+            'id', 'score', 'pub_date'
+        }
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        assert '"text"' not in sql and 'reviews_user' not in sql
+
+    def test_07_review_integrity_errors(self, django_user_model):
+        title, review = create_thread(django_user_model, 1)
+        data = {'text': 'Отзыв', 'score': 5}
+
+        serializer = ReviewSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        with pytest.raises(serializers.ValidationError):
+            serializer.save(author=review.author, title=title)
+
+        serializer = ReviewSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        # Произведение удалено другим запросом после проверки родителя.
+        with pytest.raises(IntegrityError):
+            serializer.save(
+                author=review.author, title=Title(id=title.id + 1)
+            )
+        assert Review.objects.count() == 1
+
+    def test_08_slug_cache_entry_deleted_elsewhere(self, admin_client,
+                                                   settings):
+        settings.API_SLUG_CACHE_TIMEOUT = 60
+        category = create_categories(admin_client)[0]['slug']
+        genre = Genre.objects.create(name='Нуар', slug='noir')
+        assert slug_caches[Genre].get_many(['noir'])
+        # Жанр удаляет другой процесс: сигналы этого процесса не приходят.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM reviews_genre WHERE id = %s', [genre.id]
+            )
+
+        response = admin_client.post('/api/v1/titles/', data={
+            'name': 'Сталкер',
+            'year': 1979,
+            'genre': ['noir'],
+            'category': category,
+        })
+
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что жанр, удалённый после попадания в кеш slug, '
+            'даёт ответ 400, а не ошибку сервера.'
+        )
+        assert 'genre' in response.json()
+        assert not Title.objects.exists()
+        assert not slug_caches[Genre].get_many(['noir'])
+
+    def test_09_slug_cache_timeout(self, settings):
+        Genre.objects.create(name='Нуар', slug='noir')
+        for timeout, queries in ((0, 2), (60, 1)):
+            settings.API_SLUG_CACHE_TIMEOUT = timeout
+            slug_caches[Genre].clear()
+            with CaptureQueriesContext(connection) as context:
+                slug_caches[Genre].get_many(['noir'])
+                slug_caches[Genre].get_many(['noir'])
+            assert len(context.captured_queries) == queries, (
+                'Проверьте, что кеш slug выключен при '
+                '`API_SLUG_CACHE_TIMEOUT = 0` и работает при положительном.'
+            )
+
+        slug_caches[Genre].expires = 0
+        with CaptureQueriesContext(connection) as context:
+            slug_caches[Genre].get_many(['noir'])
+        assert len(context.captured_queries) == 1, (
+            'Проверьте, что записи кеша slug устаревают через '
+            '`API_SLUG_CACHE_TIMEOUT` секунд.'
+        )
+
+
+@pytest.mark.django_db(transaction=True)
+class Test08ServerTiming:
+    REVIEWS_URL_TEMPLATE = '/api/v1/titles/{title_id}/reviews/'
+
+    def test_01_timing_headers(self, client, settings, django_user_model):
+        settings.API_SERVER_TIMING = True
+        settings.API_QUERY_COUNT_HEADER = True
+        title, _ = create_thread(django_user_model, 2)
+
+        response = client.get(
+            self.REVIEWS_URL_TEMPLATE.format(title_id=title.id)
+        )
+
+        assert response.headers.get('X-Query-Count') == str(
+            Test08QueryCount.LIST_QUERIES
+        ), (
+            'Проверьте, что заголовок `X-Query-Count` содержит число '
+            'SQL-запросов запроса.'
+        )
+        metrics = {
+            metric.split(';')[0]
+            for metric in response.headers['Server-Timing'].split(', ')
+        }
+        assert {'db', 'auth', 'view', 'serializer', 'total'} <= metrics, (
+            'Проверьте, что `Server-Timing` содержит время базы, проверок '
+            'доступа, view, сериализации и всего запроса.'
+        )
+        assert (
+            f'desc="{Test08QueryCount.LIST_QUERIES} queries"'
+            in response.headers['Server-Timing']
+        )
+
+    def test_02_no_headers_when_disabled(self, client, settings):
+        settings.API_SERVER_TIMING = False
+        response = client.get('/api/v1/titles/')
+        assert 'Server-Timing' not in response.headers
+        assert 'X-Query-Count' not in response.headers
+
+    def test_03_only_api_requests(self, client, settings):
+        settings.API_SERVER_TIMING = True
+        response = client.get('/redoc/')
+        assert 'Server-Timing' not in response.headers, (
+            'Проверьте, что `Server-Timing` добавляется только к запросам '
+            'к API.'
+        )
+
+    def test_04_nested_serializers_counted_once(self):
+        class Inner(TimedSerializerMixin, serializers.Serializer):
+            value = serializers.SerializerMethodField()
+
+            def get_value(self, obj):
+                time.sleep(0.05)
+                return 1
+
+        class Outer(TimedSerializerMixin, serializers.Serializer):
+            inner = serializers.SerializerMethodField()
+
+            def get_inner(self, obj):
+                return Inner(obj).data
+
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        try:
+            started = time.perf_counter()
+            Outer(object()).data
+            elapsed = time.perf_counter() - started
+        finally:
+            request_timings.reset(token)
+
+        assert timings.durations['serializer'] <= elapsed, (
+            'Проверьте, что время вложенного сериализатора не считается в '
+            '`Server-Timing` дважды.'
+        )
+
+
+@pytest.mark.django_db(transaction=True)
+class Test08SlowQueryLog:
+
+    def test_01_slow_queries_are_logged_with_plan(self, client, admin_client,
+                                                  settings, caplog):
+        settings.API_SLOW_QUERY_MS = 0
+        create_titles(admin_client)
+        slow_query_log.clear()
+
+        with connection.execute_wrapper(slow_query_log):
+            for year in (1984, 1988):
+                client.get('/api/v1/titles/', {'year': year})
+
+        entries = [
+            entry for entry in slow_query_log.get_stats()
+            if 'FROM "reviews_title"' in entry['sql']
+            and 'COUNT' not in entry['sql']
+        ]
+        assert len(entries) == 1 and entries[0]['count'] == 2, (
+            'Проверьте, что запросы с разными параметрами сводятся к одному '
+            'нормализованному отпечатку.'
+        )
+        entry = entries[0]
+        assert '"year" = ?' in entry['sql']
+        assert any(
+            'TitleViewSet.list' in caller for caller in entry['callers']
+        ), 'Проверьте, что в записи указан вызвавший запрос view.'
+        assert 'SCAN' in entry['plan'] or 'SEARCH' in entry['plan'], (
+            'Проверьте, что для медленного запроса сохраняется план EXPLAIN.'
+        )
+        assert any(
+            entry['fingerprint'] in record.getMessage()
+            for record in caplog.records
+            if record.name == 'api.slow_queries'
+        )
+
+
+def get_token_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_access_token(user)}')
+    return client
+
+
+@pytest.fixture
+def auth_user_cache(settings):
+    # Тесты идут в одном процессе: LocMemCache для них общий.
+    settings.API_AUTH_USER_CACHE_TIMEOUT = 60
+    user_cache.clear()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures('auth_user_cache')
+class Test08AuthUserCache:
+    ME_URL = '/api/v1/users/me/'
+    USERS_URL = '/api/v1/users/'
+
+    def test_01_cached_user_skips_users_table(self, user,
+                                              django_assert_num_queries):
+        user_cache.clear()
+        client = get_token_client(user)
+        client.get(self.ME_URL)
+
+        with django_assert_num_queries(0):
+            response = client.get(self.ME_URL)
+
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['username'] == user.username, (
+            'Проверьте, что пользователь из кеша совпадает с владельцем '
+            'токена.'
+        )
+
+    def test_02_role_change_invalidates_cache(self, user, admin_client):
+        user_cache.clear()
+        client = get_token_client(user)
+        assert client.get(self.USERS_URL).status_code == HTTPStatus.FORBIDDEN
+
+        admin_client.patch(
+            f'{self.USERS_URL}{user.username}/', data={'role': 'admin'}
+        )
+
+        assert client.get(self.USERS_URL).status_code == HTTPStatus.OK, (
+            'Проверьте, что смена роли сразу сбрасывает пользователя из '
+            'кеша аутентификации.'
+        )
+
+    def test_03_token_role_mismatch_reloads_user(self, user):
+        user_cache.clear()
+        get_token_client(user).get(self.ME_URL)
+        # Обновление в обход сигналов, как из другого процесса.
+        type(user).objects.filter(pk=user.pk).update(role='admin')
+        user.role = 'admin'
+
+        response = get_token_client(user).get(self.USERS_URL)
+
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что при расхождении роли в токене и в кеше '
+            'пользователь перечитывается из базы.'
+        )
+
+    @pytest.mark.parametrize('change', ('demote', 'deactivate', 'delete'))
+    def test_04_change_in_other_process(self, admin, change):
+        client = get_token_client(admin)
+        assert client.get(self.USERS_URL).status_code == HTTPStatus.OK
+        # Другой процесс меняет пользователя: сигналы этого процесса не
+        # приходят, остаётся новая версия в общем кеше.
+        users = type(admin).objects.filter(pk=admin.pk)
+        if change == 'demote':
+            users.update(role='user')
+        elif change == 'deactivate':
+            users.update(is_active=False)
+        else:
+            users.delete()
+        bump_versions(USER_RESOURCE.format(admin.pk))
+
+        response = client.get(self.USERS_URL)
+
+        assert response.status_code in (
+            HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN
+        ), (
+            'Проверьте, что изменение пользователя в другом процессе сразу '
+            'отзывает права его закешированной копии.'
+        )
+
+    def test_05_disabled_without_shared_cache(self, user, settings):
+        settings.API_AUTH_USER_CACHE_TIMEOUT = 0
+        client = get_token_client(user)
+        client.get(self.ME_URL)
+
+        with CaptureQueriesContext(connection) as context:
+            client.get(self.ME_URL)
+
+        assert any(
+            'FROM "reviews_user"' in query['sql']
+            for query in context.captured_queries
+        ), (
+            'Проверьте, что при `API_AUTH_USER_CACHE_TIMEOUT = 0` '
+            'пользователь читается из базы на каждый запрос.'
+        )
@@ -0,0 +1,191 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import transaction
+
+from api.cache import get_response_cache_stats, get_versions
+from reviews.models import Genre
+from tests.utils import create_genre, create_titles
+
+
+@pytest.fixture
+def response_cache(settings):
+    # Тесты идут в одном процессе: LocMemCache для них общий.
+    settings.API_RESPONSE_CACHE_TIMEOUT = 300
+
+
+@pytest.fixture
+def conditional_get(settings):
+    settings.API_CONDITIONAL_GET = True
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures('response_cache')
+class Test09ResponseCache:
+    TITLES_URL = '/api/v1/titles/'
+    GENRES_URL = '/api/v1/genres/'
+
+    def test_01_repeated_get_is_served_from_cache(
+            self, client, admin_client, django_assert_num_queries):
+        create_titles(admin_client)
+        first = client.get(self.TITLES_URL)
+        stats_before = get_response_cache_stats()
+
+        with django_assert_num_queries(0):
+            second = client.get(self.TITLES_URL)
+
+        assert second.status_code == HTTPStatus.OK
+        assert second.content == first.content, (
+            f'Проверьте, что повторный GET-запрос к `{self.TITLES_URL}` '
+            'возвращает тот же ответ.'
+        )
+        stats_after = get_response_cache_stats()
+        assert stats_after['hits'] == stats_before['hits'] + 1
+
+    def test_02_write_invalidates_cached_responses(self, client,
+                                                   admin_client):
+        titles, _, genres = create_titles(admin_client)
+        client.get(self.TITLES_URL)
+        client.get(self.GENRES_URL)
+
+        response = admin_client.patch(
+            f'{self.TITLES_URL}{titles[0]["id"]}/', data={'name': 'Новое'}
+        )
+        assert response.status_code == HTTPStatus.OK
+        names = {
+            title['name'] for title in client.get(self.TITLES_URL).json()[
+                'results'
+            ]
+        }
+        assert 'Новое' in names, (
+            'Проверьте, что после изменения произведения GET-запрос к '
+            f'`{self.TITLES_URL}` не возвращает устаревший ответ из кеша.'
+        )
+
+        admin_client.delete(f'{self.GENRES_URL}{genres[0]["slug"]}/')
+        slugs = {
+            genre['slug'] for genre in client.get(self.GENRES_URL).json()[
+                'results'
+            ]
+        }
+        assert genres[0]['slug'] not in slugs
+        title = client.get(f'{self.TITLES_URL}{titles[0]["id"]}/').json()
+        assert genres[0] not in title['genre'], (
+            'Проверьте, что удаление жанра сбрасывает кеш произведений.'
+        )
+
+    def test_03_query_params_are_part_of_key(self, client, admin_client):
+        create_genre(admin_client)
+        all_genres = client.get(self.GENRES_URL).json()
+        found = client.get(self.GENRES_URL, {'search': 'Ужасы'}).json()
+        assert found['count'] == 1
+        assert all_genres['count'] == 3
+
+    def test_04_versions_change_after_commit(self):
+        version = get_versions('genres')
+        with transaction.atomic():
+            Genre.objects.create(name='Нуар', slug='noir')
+            assert get_versions('genres') == version, (
+                'Проверьте, что версия ресурса не меняется до коммита: '
+                'иначе в кеш под новой версией попадёт старый ответ.'
+            )
+        assert get_versions('genres') != version, (
+            'Проверьте, что после коммита версия ресурса меняется.'
+        )
+
+    def test_05_disabled_without_shared_cache(self, client, admin_client,
+                                              settings):
+        settings.API_RESPONSE_CACHE_TIMEOUT = 0
+        create_genre(admin_client)
+        stats_before = get_response_cache_stats()
+        client.get(self.GENRES_URL)
+        client.get(self.GENRES_URL)
+        assert get_response_cache_stats() == stats_before, (
+            'Проверьте, что при `API_RESPONSE_CACHE_TIMEOUT = 0` ответы не '
+            'кешируются.'
+        )
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures('conditional_get')
+class Test09ConditionalGet:
+    TITLE_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+    REVIEWS_URL_TEMPLATE = '/api/v1/titles/{title_id}/reviews/'
+
+    def test_01_not_modified_without_queries(self, client, admin_client,
+                                             django_assert_num_queries):
+        titles, _, _ = create_titles(admin_client)
+        for url in (
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[0]['id']),
+            self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]['id']),
+        ):
+            response = client.get(url)
+            etag = response.headers.get('ETag')
+            assert etag and response.headers.get('Last-Modified'), (
+                f'Проверьте, что ответ на GET-запрос к `{url}` содержит '
+                'заголовки `ETag` и `Last-Modified`.'
+            )
+            with django_assert_num_queries(0):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.NOT_MODIFIED, (
+                f'Проверьте, что GET-запрос к `{url}` с актуальным '
+                '`If-None-Match` возвращает ответ со статусом 304.'
+            )
+            assert not response.content
+
+    def test_02_write_changes_etag(self, client, admin_client, user_client):
+        titles, _, _ = create_titles(admin_client)
+        detail_url = self.TITLE_DETAIL_URL_TEMPLATE.format(
+            title_id=titles[0]['id']
+        )
+        reviews_url = self.REVIEWS_URL_TEMPLATE.format(
+            title_id=titles[0]['id']
+        )
+        etags = {
+            url: client.get(url).headers['ETag']
+            for url in (detail_url, reviews_url)
+        }
+
+        user_client.post(reviews_url, data={'text': 'Отзыв', 'score': 7})
+
+        for url, etag in etags.items():
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.OK, (
+                f'Проверьте, что после нового отзыва GET-запрос к `{url}` '
+                'со старым `If-None-Match` возвращает свежий ответ.'
+            )
+            assert response.headers['ETag'] != etag
+        assert client.get(detail_url).json()['rating'] == 7
+
+    def test_03_parent_delete_changes_etag(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        reviews_url = self.REVIEWS_URL_TEMPLATE.format(
+            title_id=titles[0]['id']
+        )
+        etag = client.get(reviews_url).headers['ETag']
+
+        admin_client.delete(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[0]['id'])
+        )
+
+        response = client.get(reviews_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что после удаления произведения без отзывов '
+            f'GET-запрос к `{reviews_url}` со старым `If-None-Match` '
+            'возвращает 404, а не 304.'
+        )
+
+    def test_04_disabled_without_shared_cache(self, client, admin_client,
+                                              settings):
+        settings.API_CONDITIONAL_GET = False
+        titles, _, _ = create_titles(admin_client)
+        url = self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[0]['id'])
+
+        response = client.get(url, HTTP_IF_NONE_MATCH='*')
+
+        assert response.status_code == HTTPStatus.OK
+        assert 'ETag' not in response.headers, (
+            'Проверьте, что при `API_CONDITIONAL_GET = False` ответы не '
+            'получают `ETag`: версии ресурсов каждого процесса не видят '
+            'записей других процессов.'
+        )
@@ -0,0 +1,270 @@
+"""Замеры горячих эндпоинтов на большом сгенерированном наборе данных.
+
+Запускаются только с переменной окружения YAMDB_BENCHMARK=1:
+
+    YAMDB_BENCHMARK=1 pytest tests/test_10_benchmarks.py
+
+Размер набора, число замеров и бюджеты задаёт benchmark_budgets.json.
+Результаты пишутся в JSON (YAMDB_BENCHMARK_OUTPUT, по умолчанию
+benchmark-results.json), чтобы сравнивать их между коммитами.
+"""
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from http import HTTPStatus
+from itertools import combinations
+from pathlib import Path
+
+import django
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.serializers import TitleListSerializer, TitleReadSerializer
+from reviews.models import Review, Title, User
+from reviews.outbox import deliver_pending
+
+BUDGETS = json.loads(
+    Path(__file__).with_name('benchmark_budgets.json').read_text(
+        encoding='utf-8'
+    )
+)
+# Значения фильтров TitleFilter, которые есть в сгенерированных данных.
+TITLE_FILTERS = {
+    'name': 'Тихий',
+    'genre': 'genre-1',
+    'category': 'category-1',
+    'year': 2020,
+}
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('YAMDB_BENCHMARK'),
+    reason='Замеры запускаются с YAMDB_BENCHMARK=1.'
+)
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@pytest.fixture(scope='module')
+def dataset(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        call_command(
+            'generate_data', stdout=io.StringIO(), **BUDGETS['dataset']
+        )
+        yield BUDGETS['dataset']
+        call_command('flush', interactive=False, verbosity=0)
+
+
+@pytest.fixture(scope='module')
+def results(dataset):
+    collected = {}
+    yield collected
+    output = os.environ.get(
+        'YAMDB_BENCHMARK_OUTPUT', 'benchmark-results.json'
+    )
+    Path(output).write_text(json.dumps({
+        'commit': get_commit(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'dataset': dataset,
+        'results': collected,
+    }, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+@pytest.fixture(autouse=True)
+def uncached_responses(settings):
+    # Замеряется сборка ответа, а не чтение из кеша ответов.
+    settings.API_RESPONSE_CACHE_TIMEOUT = 0
+
+
+def get_budget(name):
+    endpoints = BUDGETS['endpoints']
+    return endpoints.get(name) or endpoints[name.split('?')[0]]
+
+
+def benchmark(results, name, prepare):
+    """Замеряет запрос name и проверяет его бюджет.
+
+    prepare(номер) готовит запрос вне замера и возвращает функцию,
+    которая его отправляет. Первые warmup запросов не учитываются.
+    """
+    warmup, rounds = BUDGETS['warmup'], BUDGETS['rounds']
+    latencies = []
+    query_counts = []
+    for index in range(warmup + rounds):
+        send = prepare(index)
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = send()
+            elapsed = time.perf_counter() - started
+        assert response.status_code < HTTPStatus.BAD_REQUEST, (
+            f'Замер `{name}`: запрос вернул статус {response.status_code}.'
+        )
+        if index >= warmup:
+            latencies.append(elapsed * 1000)
+            query_counts.append(len(context.captured_queries))
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    result = results[name] = {
+        'rounds': rounds,
+        'p50_ms': round(percentiles[49], 3),
+        'p95_ms': round(percentiles[94], 3),
+        'p99_ms': round(percentiles[98], 3),
+        'max_ms': round(max(latencies), 3),
+        'queries': max(query_counts),
+    }
+    budget = get_budget(name)
+    assert result['queries'] <= budget['queries'], (
+        f'Замер `{name}`: {result["queries"]} SQL-запросов при бюджете '
+        f'{budget["queries"]}.'
+    )
+    assert result['p95_ms'] <= budget['p95_ms'], (
+        f'Замер `{name}`: p95 {result["p95_ms"]} мс при бюджете '
+        f'{budget["p95_ms"]} мс.'
+    )
+
+
+def rows_per_second(serialize, rounds):
+    """Пропускная способность serialize() — число строк в секунду."""
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        rows += len(serialize())
+    return rows / (time.perf_counter() - started)
+
+
+def get(client, url, params=None):
+    return lambda index: lambda: client.get(url, params)
+
+
+@pytest.mark.django_db
+class Test10Benchmarks:
+    TITLES_URL = '/api/v1/titles/'
+    TITLE_DETAIL_URL = '/api/v1/titles/1/'
+    REVIEWS_URL_TEMPLATE = '/api/v1/titles/{title_id}/reviews/'
+    COMMENTS_URL = '/api/v1/titles/1/reviews/1/comments/'
+    SIGNUP_URL = '/api/v1/auth/signup/'
+    TOKEN_URL = '/api/v1/auth/token/'
+
+    @pytest.mark.parametrize('filters', [
+        names
+        for size in range(len(TITLE_FILTERS) + 1)
+        for names in combinations(TITLE_FILTERS, size)
+    ], ids=lambda names: ','.join(names) or 'no-filters')
+    def test_01_title_list(self, client, results, filters):
+        name = 'titles-list'
+        if filters:
+            name = f'{name}?{"&".join(filters)}'
+        benchmark(results, name, get(
+            client,
+            self.TITLES_URL,
+            {field: TITLE_FILTERS[field] for field in filters}
+        ))
+
+    def test_02_title_detail(self, client, results):
+        benchmark(results, 'title-detail', get(client, self.TITLE_DETAIL_URL))
+
+    def test_03_review_list(self, client, results):
+        benchmark(results, 'reviews-list', get(
+            client, self.REVIEWS_URL_TEMPLATE.format(title_id=1)
+        ))
+
+    def test_04_comment_list(self, client, results):
+        benchmark(results, 'comments-list', get(client, self.COMMENTS_URL))
+
+    def test_05_signup(self, client, results):
+        benchmark(results, 'signup', lambda index: lambda: client.post(
+            self.SIGNUP_URL, data={
+                'username': f'benchmark{index}',
+                'email': f'benchmark{index}@yamdb.fake',
+            }
+        ))
+
+    def test_06_token(self, client, results):
+        def prepare(index):
+            # Пользователи generate_data: user<id> с почтой на yamdb.fake.
+            data = {'username': f'user{index + 1}'}
+            client.post(self.SIGNUP_URL, data={
+                **data, 'email': f'user{index + 1}@yamdb.fake'
+            })
+            # Тест идёт в одной транзакции: коммита, после которого
+            # уходят письма, не будет.
+            deliver_pending()
+            data['confirmation_code'] = mail.outbox[-1].body.split()[-1]
+            return lambda: client.post(self.TOKEN_URL, data=data)
+
+        benchmark(results, 'token', prepare)
+
+    def test_07_review_post(self, results):
+        title = Title.objects.create(name='Замер', year=2000)
+        authors = list(User.objects.order_by('id')[
+            :BUDGETS['warmup'] + BUDGETS['rounds']
+        ])
+        url = self.REVIEWS_URL_TEMPLATE.format(title_id=title.id)
+
+        def prepare(index):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=(
+                f'Bearer {AccessToken.for_user(authors[index])}'
+            ))
+            return lambda: client.post(
+                url, data={'text': 'Отзыв', 'score': index % 10 + 1}
+            )
+
+        benchmark(results, 'review-post', prepare)
+        assert Review.objects.filter(title=title).count() == len(authors)
+
+    def test_08_title_list_serialization(self, results):
+        budget = BUDGETS['serialization']
+        page_size, rounds = budget['page_size'], budget['rounds']
+        queryset = (
+            Title.objects.select_related('category')
+            .prefetch_related('genre')
+            .order_by('-year', 'name', 'id')
+        )
+        rows = queryset.prefetch_related(None).values(
+            *TitleListSerializer.get_values_fields(
+                TitleReadSerializer().fields
+            )
+        )
+        # Первая страница вместе с выборкой строк, как в TitleViewSet.list;
+        # дальние OFFSET мерили бы сортировку в SQLite, а не сериализацию.
+        serializers = {
+            'TitleReadSerializer': lambda: TitleReadSerializer(
+                queryset[:page_size], many=True
+            ).data,
+            'TitleListSerializer': lambda: TitleListSerializer(
+                rows[:page_size], child=TitleReadSerializer()
+            ).data,
+        }
+        result = results['titles-list-serialization'] = {
+            'page_size': page_size,
+            'rounds': rounds,
+            **{
+                name: round(rows_per_second(serialize, rounds))
+                for name, serialize in serializers.items()
+            },
+        }
+        assert result['TitleListSerializer'] >= budget['min_rows_per_s'], (
+            'Сериализация списка произведений: '
+            f'{result["TitleListSerializer"]} строк/с при бюджете '
+            f'{budget["min_rows_per_s"]}.'
+        )
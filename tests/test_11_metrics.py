@@ -0,0 +1,142 @@
+import json
+import multiprocessing
+from http import HTTPStatus
+
+import pytest
+
+from api.metrics import metrics_registry, new_series
+
+METRICS_TOKEN = 'metrics-token'
+
+
+@pytest.fixture
+def metrics_dir(settings, tmp_path):
+    settings.API_METRICS_ENABLED = True
+    settings.API_METRICS_DIR = str(tmp_path)
+    settings.API_METRICS_FLUSH_INTERVAL = 0
+    settings.API_METRICS_TOKEN = METRICS_TOKEN
+    metrics_registry.clear()
+    yield tmp_path
+    metrics_registry.clear()
+
+
+def get_metrics(client, url='/api/metrics/'):
+    return client.get(url, HTTP_AUTHORIZATION=f'Bearer {METRICS_TOKEN}')
+
+
+def write_process_file(path, requests):
+    series = new_series()
+    series['requests'] = requests
+    series['request_duration_seconds']['buckets'][-1] = requests
+    path.write_text(json.dumps({
+        'series': [['TitleViewSet.list', '2xx', series]],
+        'counters': [['throttled_requests', 'ip', requests]],
+    }))
+
+
+def get_dead_pid():
+    process = multiprocessing.get_context('fork').Process(target=int)
+    process.start()
+    process.join()
+    return process.pid
+
+
+def get_samples(response):
+    return dict(
+        line.rsplit(' ', 1)
+        for line in response.content.decode().splitlines()
+        if line and not line.startswith('#')
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+class Test11Metrics:
+    METRICS_URL = '/api/metrics/'
+    TITLES_URL = '/api/v1/titles/'
+    SIGNUP_URL = '/api/v1/auth/signup/'
+
+    def test_01_requests_by_view_and_status(self, client, metrics_dir):
+        client.get(self.TITLES_URL)
+        client.get(self.TITLES_URL)
+        client.post(self.SIGNUP_URL, data={})
+        client.get('/redoc/')
+
+        response = get_metrics(client)
+
+        assert response.status_code == HTTPStatus.OK
+        assert response['Content-Type'].startswith('text/plain'), (
+            f'Проверьте, что `{self.METRICS_URL}` отдаёт текстовый формат '
+            'Prometheus.'
+        )
+        samples = get_samples(response)
+        titles = 'view="TitleViewSet.list",status="2xx"'
+        assert samples.get(f'yamdb_requests_total{{{titles}}}') == '2', (
+            'Проверьте, что метрики считают запросы по view, действию и '
+            'классу статуса.'
+        )
+        assert samples.get(
+            'yamdb_requests_total{view="SignUpView.post",status="4xx"}'
+        ) == '1'
+        assert samples.get(
+            f'yamdb_request_duration_seconds_bucket{{{titles},le="+Inf"}}'
+        ) == '2', 'Проверьте, что гистограмма времени содержит корзину +Inf.'
+        assert f'yamdb_request_db_queries_sum{{{titles}}}' in samples
+        assert f'yamdb_response_size_bytes_count{{{titles}}}' in samples
+        assert not [name for name in samples if 'TemplateView' in name], (
+            'Проверьте, что метрики собираются только для запросов к API.'
+        )
+
+    def test_02_sums_worker_processes(self, client, metrics_dir):
+        client.get(self.TITLES_URL)
+        # pid 1 жив всегда: файл считается файлом работающего процесса.
+        write_process_file(metrics_dir / '1-1.json', 5)
+
+        samples = get_samples(get_metrics(client))
+
+        titles = 'view="TitleViewSet.list",status="2xx"'
+        assert samples.get(f'yamdb_requests_total{{{titles}}}') == '6', (
+            'Проверьте, что эндпоинт складывает метрики всех процессов.'
+        )
+        assert samples.get(
+            f'yamdb_request_duration_seconds_bucket{{{titles},le="+Inf"}}'
+        ) == '6'
+
+    def test_03_dead_processes_are_archived(self, client, metrics_dir):
+        client.get(self.TITLES_URL)
+        dead_file = metrics_dir / f'{get_dead_pid()}-1.json'
+        write_process_file(dead_file, 5)
+
+        for _ in range(2):
+            samples = get_samples(get_metrics(client))
+            titles = 'view="TitleViewSet.list",status="2xx"'
+            assert samples.get(f'yamdb_requests_total{{{titles}}}') == '6', (
+                'Проверьте, что счётчики завершившегося процесса остаются '
+                'в метриках и не удваиваются.'
+            )
+            assert samples.get(
+                'yamdb_throttled_requests_total{throttle="ip"}'
+            ) == '5'
+        assert not dead_file.exists(), (
+            'Проверьте, что файл завершившегося процесса удаляется.'
+        )
+        assert (metrics_dir / 'archive.json').exists()
+
+    def test_04_requires_token(self, client, metrics_dir, settings):
+        assert client.get(self.METRICS_URL).status_code == (
+            HTTPStatus.FORBIDDEN
+        ), 'Проверьте, что метрики не отдаются без токена.'
+        response = client.get(
+            self.METRICS_URL, HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        settings.API_METRICS_TOKEN = None
+        assert get_metrics(client).status_code == HTTPStatus.FORBIDDEN, (
+            'Проверьте, что без `API_METRICS_TOKEN` метрики закрыты.'
+        )
+
+    def test_05_disabled(self, client, settings):
+        settings.API_METRICS_ENABLED = False
+        response = get_metrics(client)
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что при выключенных метриках эндпоинт недоступен.'
+        )
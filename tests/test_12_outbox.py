@@ -0,0 +1,141 @@
+import io
+from datetime import timedelta
+from http import HTTPStatus
+from smtplib import SMTPException
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.utils import timezone
+
+from reviews.models import OutgoingEmail
+from reviews.outbox import deliver_pending, enqueue_email
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException('Сервер недоступен')
+
+
+class UnreachableBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionRefusedError('Соединение отклонено')
+
+    def send_messages(self, email_messages):
+        raise AssertionError('Соединение не открыто')
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+
+@pytest.mark.django_db(transaction=True)
+class Test12EmailOutbox:
+    SIGNUP_URL = '/api/v1/auth/signup/'
+
+    def test_01_signup_does_not_wait_for_delivery(self, client, settings):
+        settings.EMAIL_OUTBOX_DELIVERY = 'worker'
+        outbox_before_count = len(mail.outbox)
+
+        response = client.post(self.SIGNUP_URL, data={
+            'username': 'outbox', 'email': 'outbox@yamdb.fake'
+        })
+
+        assert response.status_code == HTTPStatus.OK
+        assert len(mail.outbox) == outbox_before_count, (
+            'Проверьте, что регистрация только ставит письмо в очередь.'
+        )
+        email = OutgoingEmail.objects.get()
+        assert email.to == 'outbox@yamdb.fake' and email.sent is None
+
+        call_command('send_emails', stdout=io.StringIO())
+
+        assert len(mail.outbox) == outbox_before_count + 1, (
+            'Проверьте, что команда `send_emails` отправляет письма из '
+            'очереди.'
+        )
+        assert mail.outbox[-1].body == email.body
+        email.refresh_from_db()
+        assert email.sent is not None and email.attempts == 1
+
+    def test_02_failed_delivery_is_retried_with_backoff(self, settings):
+        settings.EMAIL_OUTBOX_DELIVERY = 'worker'
+        settings.EMAIL_OUTBOX_RETRY_DELAY = 60
+        settings.EMAIL_BACKEND = 'tests.test_12_outbox.FailingBackend'
+        email = enqueue_email('Тема', 'Текст', 'retry@yamdb.fake')
+
+        assert deliver_pending() == (0, 1)
+        email.refresh_from_db()
+        assert email.sent is None and email.attempts == 1
+        assert 'Сервер недоступен' in email.last_error
+        assert email.send_after > timezone.now() + timedelta(seconds=50), (
+            'Проверьте, что неудачное письмо откладывается до повтора.'
+        )
+        assert deliver_pending() == (0, 0), (
+            'Проверьте, что письмо не отправляется раньше срока повтора.'
+        )
+
+        settings.EMAIL_BACKEND = (
+            'django.core.mail.backends.locmem.EmailBackend'
+        )
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        assert deliver_pending() == (1, 0)
+        email.refresh_from_db()
+        assert email.attempts == 2 and email.last_error == ''
+
+    def test_03_batches_share_connection(self, settings):
+        settings.EMAIL_OUTBOX_DELIVERY = 'worker'
+        settings.EMAIL_BACKEND = 'tests.test_12_outbox.CountingBackend'
+        CountingBackend.opened = 0
+        outbox_before_count = len(mail.outbox)
+        for index in range(5):
+            enqueue_email('Тема', 'Текст', f'batch{index}@yamdb.fake')
+
+        assert deliver_pending(batch_size=2) == (5, 0)
+        assert len(mail.outbox) == outbox_before_count + 5
+        assert CountingBackend.opened == 1, (
+            'Проверьте, что все пачки отправляются через одно соединение.'
+        )
+
+    def test_04_connection_failure_defers_batch(self, settings):
+        settings.EMAIL_OUTBOX_DELIVERY = 'worker'
+        settings.EMAIL_OUTBOX_RETRY_DELAY = 60
+        settings.EMAIL_BACKEND = 'tests.test_12_outbox.UnreachableBackend'
+        for index in range(3):
+            enqueue_email('Тема', 'Текст', f'down{index}@yamdb.fake')
+
+        assert deliver_pending(batch_size=2) == (0, 2)
+
+        attempts = sorted(
+            OutgoingEmail.objects.values_list('attempts', flat=True)
+        )
+        assert attempts == [0, 1, 1], (
+            'Проверьте, что без соединения неудачной попыткой считается '
+            'только забранная пачка.'
+        )
+        for email in OutgoingEmail.objects.filter(attempts=1):
+            assert 'Соединение отклонено' in email.last_error
+            assert email.send_after > timezone.now() + timedelta(
+                seconds=50
+            ), 'Проверьте, что пачка без соединения откладывается.'
+
+    def test_05_sync_signup_survives_connection_failure(self, client,
+                                                        settings):
+        settings.EMAIL_BACKEND = 'tests.test_12_outbox.UnreachableBackend'
+
+        response = client.post(self.SIGNUP_URL, data={
+            'username': 'unreachable', 'email': 'unreachable@yamdb.fake'
+        })
+
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что недоступный почтовый сервер не ломает '
+            'регистрацию при синхронной отправке.'
+        )
+        email = OutgoingEmail.objects.get()
+        assert email.sent is None and email.attempts == 1
@@ -0,0 +1,101 @@
+import io
+from datetime import timedelta
+from http import HTTPStatus
+
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reviews.models import ConfirmationCode
+
+SIGNUP_URL = '/api/v1/auth/signup/'
+TOKEN_URL = '/api/v1/auth/token/'
+SIGNUP_DATA = {'username': 'coded', 'email': 'coded@yamdb.fake'}
+
+
+def sign_up(client):
+    client.post(SIGNUP_URL, data=SIGNUP_DATA)
+    return mail.outbox[-1].body.split()[-1]
+
+
+def obtain_token(client, code):
+    return client.post(TOKEN_URL, data={
+        'username': SIGNUP_DATA['username'], 'confirmation_code': code
+    })
+
+
+@pytest.mark.django_db(transaction=True)
+class Test13ConfirmationCodes:
+
+    def test_01_auth_does_not_rewrite_user_row(self, client):
+        sign_up(client)
+
+        with CaptureQueriesContext(connection) as context:
+            code = sign_up(client)
+            response = obtain_token(client, code)
+
+        assert response.status_code == HTTPStatus.OK
+        assert not [
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "reviews_user"')
+        ], (
+            'Проверьте, что повторная регистрация и получение токена не '
+            'перезаписывают строку пользователя.'
+        )
+        assert not ConfirmationCode.objects.exists(), (
+            'Проверьте, что использованный код удаляется.'
+        )
+
+    def test_02_attempts_are_limited(self, client, settings):
+        settings.CONFIRMATION_CODE_MAX_ATTEMPTS = 2
+        code = sign_up(client)
+        wrong_code = '000000' if code != '000000' else '111111'
+
+        for _ in range(2):
+            response = obtain_token(client, wrong_code)
+            assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = obtain_token(client, code)
+
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что после исчерпания попыток верный код тоже '
+            'отклоняется.'
+        )
+        assert ConfirmationCode.objects.get().attempts == 2
+
+        response = obtain_token(client, sign_up(client))
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что новый код сбрасывает счётчик попыток.'
+        )
+
+    def test_03_expired_codes(self, client):
+        code = sign_up(client)
+        ConfirmationCode.objects.update(
+            expires=timezone.now() - timedelta(seconds=1)
+        )
+
+        assert obtain_token(client, code).status_code == (
+            HTTPStatus.BAD_REQUEST
+        ), 'Проверьте, что истёкший код не обменивается на токен.'
+
+        call_command('clear_confirmation_codes', stdout=io.StringIO())
+        assert not ConfirmationCode.objects.exists(), (
+            'Проверьте, что `clear_confirmation_codes` удаляет истёкшие коды.'
+        )
+
+    def test_04_attempt_is_counted_before_check(self, client, settings):
+        settings.CONFIRMATION_CODE_MAX_ATTEMPTS = 1
+        code = sign_up(client)
+        codes = ConfirmationCode.objects.all()
+
+        assert codes.count_attempt(1) == 1
+        assert codes.count_attempt(1) == 0, (
+            'Проверьте, что попытка сверх лимита не засчитывается: '
+            'проверка и увеличение счётчика идут одним запросом.'
+        )
+        assert ConfirmationCode.objects.get().attempts == 1
+        assert obtain_token(client, code).status_code == (
+            HTTPStatus.BAD_REQUEST
+        ), 'Проверьте, что после исчерпания попыток код не принимается.'
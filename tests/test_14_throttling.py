@@ -0,0 +1,125 @@
+from hashlib import md5
+from http import HTTPStatus
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.metrics import metrics_registry
+from api.throttling import BUCKET_KEY, TokenBucketThrottle
+
+SIGNUP_URL = '/api/v1/auth/signup/'
+TOKEN_URL = '/api/v1/auth/token/'
+
+
+@pytest.fixture
+def throttle_rates(settings):
+    cache.clear()
+    settings.API_THROTTLE_RATES = {'ip': '3/min', 'username': '2/min'}
+    yield settings.API_THROTTLE_RATES
+    cache.clear()
+
+
+def sign_up(client, index, username=None, **kwargs):
+    return client.post(SIGNUP_URL, data={
+        'username': username or f'throttled{index}',
+        'email': f'throttled{index}@yamdb.fake',
+    }, **kwargs)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test14Throttling:
+
+    def test_01_ip_bucket(self, client, throttle_rates):
+        for index in range(3):
+            assert sign_up(client, index).status_code == HTTPStatus.OK
+
+        with CaptureQueriesContext(connection) as context:
+            response = sign_up(client, 3)
+
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS, (
+            'Проверьте, что запросы сверх лимита IP получают ответ 429.'
+        )
+        assert 'Retry-After' in response.headers
+        assert not context.captured_queries, (
+            'Проверьте, что отклонённый запрос не обращается к базе.'
+        )
+        assert sign_up(
+            client, 4, REMOTE_ADDR='10.0.0.1'
+        ).status_code == HTTPStatus.OK, (
+            'Проверьте, что у каждого IP своя корзина.'
+        )
+        assert client.post(TOKEN_URL, data={}).status_code == (
+            HTTPStatus.BAD_REQUEST
+        ), 'Проверьте, что у регистрации и получения токена разные корзины.'
+
+    def test_02_username_bucket(self, client, throttle_rates):
+        for index in range(2):
+            response = sign_up(
+                client, index, username='target',
+                REMOTE_ADDR=f'10.0.0.{index}'
+            )
+            assert response.status_code != HTTPStatus.TOO_MANY_REQUESTS
+
+        response = sign_up(
+            client, 2, username='target', REMOTE_ADDR='10.0.0.2'
+        )
+
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS, (
+            'Проверьте, что запросы сверх лимита username получают 429 с '
+            'любого IP.'
+        )
+
+    def test_03_rejections_in_metrics(self, client, settings,
+                                      throttle_rates):
+        settings.API_METRICS_ENABLED = True
+        settings.API_METRICS_DIR = None
+        settings.API_METRICS_TOKEN = 'metrics-token'
+        metrics_registry.clear()
+        for index in range(4):
+            sign_up(client, index)
+
+        content = client.get(
+            '/api/metrics/', HTTP_AUTHORIZATION='Bearer metrics-token'
+        ).content.decode()
+
+        assert 'yamdb_throttled_requests_total{throttle="ip"} 1' in content, (
+            'Проверьте, что отклонённые запросы считаются в метриках.'
+        )
+        assert (
+            'yamdb_requests_total{view="SignUpView.post",status="4xx"} 1'
+            in content
+        )
+        metrics_registry.clear()
+
+    def test_04_forwarded_for_ignored(self, client, throttle_rates):
+        for index in range(3):
+            assert sign_up(client, index).status_code == HTTPStatus.OK
+
+        response = sign_up(client, 3, HTTP_X_FORWARDED_FOR='10.0.0.1')
+
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS, (
+            'Проверьте, что без `NUM_PROXIES` лимит IP считается по '
+            '`REMOTE_ADDR`, а не по заголовку `X-Forwarded-For`.'
+        )
+
+    def test_05_locked_bucket(self, client, throttle_rates):
+        bucket_key = BUCKET_KEY.format(
+            'SignUpView', 'ip', md5(b'127.0.0.1').hexdigest()
+        )
+        # Корзину держит другой процесс.
+        cache.add(f'{bucket_key}:lock', 1)
+
+        response = sign_up(client, 0)
+
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS, (
+            'Проверьте, что запрос не обходит лимит, пока корзина '
+            'заблокирована другим запросом.'
+        )
+        cache.delete(f'{bucket_key}:lock')
+        assert sign_up(client, 1).status_code == HTTPStatus.OK
+
+    def test_06_abstract_base(self):
+        with pytest.raises(TypeError):
+            TokenBucketThrottle()
@@ -0,0 +1,234 @@
+import json
+from base64 import urlsafe_b64encode
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Category, Comment, Review, Title
+
+PAGE_SIZE = 10
+
+
+def walk(client, url, link='next'):
+    """Страницы по ссылкам link: список пар (адрес, id на странице)."""
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что страница `{url}` открывается.'
+        )
+        data = response.json()
+        assert 'count' not in data, (
+            'Проверьте, что курсорная пагинация не считает `count`.'
+        )
+        pages.append((url, [row['id'] for row in data['results']]))
+        url = data[link]
+    return pages
+
+
+def check_round_trip(client, url, expected_ids):
+    forward = walk(client, url)
+    assert [
+        row_id for _, ids in forward for row_id in ids
+    ] == expected_ids, (
+        'Проверьте, что страницы по ссылкам `next` без пропусков и '
+        'повторов дают весь список в порядке сортировки.'
+    )
+    assert all(len(ids) == PAGE_SIZE for _, ids in forward[:-1])
+    last_url = forward[-1][0]
+    backward = walk(client, last_url, link='previous')
+    assert [ids for _, ids in reversed(backward)] == [
+        ids for _, ids in forward
+    ], (
+        'Проверьте, что ссылки `previous` возвращают те же страницы в '
+        'обратном порядке.'
+    )
+
+
+@pytest.fixture
+def titles():
+    categories = [
+        Category.objects.create(name=f'Категория {idx}', slug=f'cat-{idx}')
+        for idx in range(2)
+    ]
+    # Годы повторяются: сортировка по году неоднозначна без id.
+    return [
+        Title.objects.create(
+            name=f'Произведение {idx % 7}',
+            year=2000 + idx % 3,
+            category=categories[idx % 2],
+        )
+        for idx in range(25)
+    ]
+
+
+def encode_cursor(payload):
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@pytest.mark.django_db(transaction=True)
+class Test15TitleCursorPagination:
+    URL = '/api/v1/titles/'
+
+    def test_01_round_trip(self, client, titles):
+        expected = [
+            title.id for title in sorted(
+                titles, key=lambda title: (-title.year, title.name, title.id)
+            )
+        ]
+        check_round_trip(client, f'{self.URL}?cursor=', expected)
+
+    @pytest.mark.parametrize('ordering', ('year', '-year', 'name'))
+    def test_02_ties_on_ordering(self, client, titles, ordering):
+        field = ordering.lstrip('-')
+        expected = sorted(titles, key=lambda title: title.id)
+        expected.sort(
+            key=lambda title: getattr(title, field),
+            reverse=ordering.startswith('-')
+        )
+        check_round_trip(
+            client,
+            f'{self.URL}?cursor=&ordering={ordering}',
+            [title.id for title in expected],
+        )
+
+    def test_03_with_filters(self, client, titles):
+        expected = [
+            title.id for title in sorted(
+                titles, key=lambda title: (-title.year, title.name, title.id)
+            )
+            if title.category.slug == 'cat-1'
+        ]
+        check_round_trip(
+            client, f'{self.URL}?cursor=&category=cat-1', expected
+        )
+
+    @pytest.mark.parametrize('cursor', (
+        'не-курсор',
+        encode_cursor({'p': [2000], 'r': 0}),
+        encode_cursor({'p': ['год', 'имя', 1], 'r': 0}),
+        encode_cursor({'r': 0}),
+    ), ids=('not-base64', 'short-position', 'wrong-types', 'no-position'))
+    def test_04_invalid_cursor(self, client, titles, cursor):
+        response = client.get(self.URL, {'cursor': cursor})
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что некорректный курсор возвращает 404.'
+        )
+
+    @pytest.mark.skipif(
+        connection.vendor != 'sqlite', reason='план запроса SQLite'
+    )
+    @pytest.mark.parametrize('link', ('next', 'previous'))
+    def test_05_position_uses_index_range(self, client, titles, link):
+        first = client.get(self.URL, {'cursor': ''}).json()
+        url = client.get(first['next']).json()[link]
+
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+
+        page_sql = next(
+            query['sql'] for query in context.captured_queries
+            if 'FROM "reviews_title"' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {page_sql}')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        assert 'SEARCH reviews_title USING INDEX title_year_name_id_idx' in (
+            plan
+        ) and 'TEMP B-TREE' not in plan, (
+            'Проверьте, что страница по курсору читает диапазон индекса '
+            f'`title_year_name_id_idx` без пересортировки, план: {plan}'
+        )
+
+
+@pytest.fixture
+def thread(django_user_model):
+    title = Title.objects.create(name='Солярис', year=1972)
+    authors = [
+        django_user_model.objects.create_user(
+            username=f'reader{idx}', email=f'reader{idx}@yamdb.fake'
+        )
+        for idx in range(25)
+    ]
+    reviews = [
+        Review.objects.create(
+            title=title, author=author, text='Отзыв', score=idx % 10 + 1
+        )
+        for idx, author in enumerate(authors)
+    ]
+    comments = [
+        Comment.objects.create(
+            review=reviews[0], author=author, text='Комментарий'
+        )
+        for author in authors
+    ]
+    # Одинаковое время публикации: порядок решает id.
+    Review.objects.filter(
+        id__in=[review.id for review in reviews[::2]]
+    ).update(pub_date=reviews[0].pub_date)
+    return title, reviews, comments
+
+
+def by_publication(objects):
+    return [
+        obj.id for obj in sorted(
+            (type(obj).objects.get(pk=obj.pk) for obj in objects),
+            key=lambda obj: (obj.pub_date, obj.id)
+        )
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test15NestedCursorPagination:
+    REVIEWS_URL_TEMPLATE = '/api/v1/titles/{title_id}/reviews/'
+    COMMENTS_URL_TEMPLATE = (
+        '/api/v1/titles/{title_id}/reviews/{review_id}/comments/'
+    )
+
+    def get_urls(self, title, review):
+        return (
+            self.REVIEWS_URL_TEMPLATE.format(title_id=title.id),
+            self.COMMENTS_URL_TEMPLATE.format(
+                title_id=title.id, review_id=review.id
+            ),
+        )
+
+    def test_01_reviews_round_trip(self, client, thread):
+        title, reviews, _ = thread
+        reviews_url, _ = self.get_urls(title, reviews[0])
+        check_round_trip(
+            client, f'{reviews_url}?cursor=', by_publication(reviews)
+        )
+
+    def test_02_comments_round_trip(self, client, thread):
+        title, reviews, comments = thread
+        _, comments_url = self.get_urls(title, reviews[0])
+        check_round_trip(
+            client, f'{comments_url}?cursor=', by_publication(comments)
+        )
+
+    @pytest.mark.parametrize('cursor', (
+        'не-курсор',
+        encode_cursor({'p': ['дата', 1], 'r': 0}),
+        encode_cursor({'p': [1], 'r': 0}),
+    ), ids=('not-base64', 'wrong-types', 'short-position'))
+    def test_03_invalid_cursor(self, client, thread, cursor):
+        title, reviews, _ = thread
+        for url in self.get_urls(title, reviews[0]):
+            response = client.get(url, {'cursor': cursor})
+            assert response.status_code == HTTPStatus.NOT_FOUND, (
+                f'Проверьте, что некорректный курсор для `{url}` '
+                'возвращает 404.'
+            )
+
+    def test_04_missing_parent(self, client, thread):
+        title, reviews, _ = thread
+        missing = Title(id=title.id + 1)
+        for url in self.get_urls(missing, reviews[0]):
+            response = client.get(url, {'cursor': ''})
+            assert response.status_code == HTTPStatus.NOT_FOUND, (
+                f'Проверьте, что `{url}` без родителя возвращает 404 и в '
+                'курсорном режиме.'
+            )
@@ -0,0 +1,114 @@
+from http import HTTPStatus
+
+import pytest
+from django.db.models import Count, Sum
+
+from reviews.models import Review, Title
+
+
+def assert_ratings_match_reviews():
+    for title in Title.objects.annotate(
+        total=Sum('reviews__score'), number=Count('reviews')
+    ):
+        assert (title.rating_sum, title.rating_count) == (
+            title.total or 0, title.number
+        ), (
+            f'Проверьте, что сумма и число оценок произведения `{title}` '
+            'совпадают с его отзывами.'
+        )
+        expected = title.total // title.number if title.number else None
+        assert title.rating == expected, (
+            f'Проверьте рейтинг произведения `{title}`.'
+        )
+
+
+@pytest.fixture
+def rated_titles(django_user_model):
+    titles = [
+        Title.objects.create(name=f'Произведение {idx}', year=2000)
+        for idx in range(2)
+    ]
+    authors = [
+        django_user_model.objects.create_user(
+            username=f'critic{idx}', email=f'critic{idx}@yamdb.fake'
+        )
+        for idx in range(3)
+    ]
+    reviews = [
+        Review.objects.create(
+            title=title, author=author, text='Отзыв',
+            score=(idx + title_idx) % 10 + 1
+        )
+        for title_idx, title in enumerate(titles)
+        for idx, author in enumerate(authors)
+    ]
+    return titles, authors, reviews
+
+
+@pytest.mark.django_db(transaction=True)
+class Test16Ratings:
+
+    def test_01_score_change(self, rated_titles, user_client, user):
+        titles, _, _ = rated_titles
+        url = f'/api/v1/titles/{titles[0].id}/reviews/'
+        review_id = user_client.post(
+            url, data={'text': 'Отзыв', 'score': 2}
+        ).json()['id']
+
+        response = user_client.patch(f'{url}{review_id}/', data={'score': 9})
+
+        assert response.status_code == HTTPStatus.OK
+        assert_ratings_match_reviews()
+
+    def test_02_title_move(self, rated_titles, django_user_model):
+        titles, _, _ = rated_titles
+        author = django_user_model.objects.create_user(
+            username='mover', email='mover@yamdb.fake'
+        )
+        review = Review.objects.create(
+            title=titles[0], author=author, text='Отзыв', score=10
+        )
+
+        review.title = titles[1]
+        review.score = 1
+        review.save()
+
+        assert_ratings_match_reviews()
+
+    def test_03_stale_instances(self, rated_titles):
+        _, _, reviews = rated_titles
+        first = Review.objects.get(pk=reviews[0].pk)
+        second = Review.objects.get(pk=reviews[0].pk)
+
+        first.score = 3
+        first.save()
+        # Копия загружена до первого изменения и помнит старую оценку.
+        second.score = 8
+        second.save()
+        assert_ratings_match_reviews()
+
+        third = Review.objects.get(pk=reviews[1].pk)
+        changed = Review.objects.get(pk=reviews[1].pk)
+        changed.score = 1
+        changed.save()
+        # Удаляется копия со старой оценкой.
+        third.delete()
+        assert_ratings_match_reviews()
+
+    def test_04_instance_and_queryset_delete(self, rated_titles):
+        titles, _, reviews = rated_titles
+        reviews[0].delete()
+        assert_ratings_match_reviews()
+
+        Review.objects.filter(title=titles[1]).delete()
+        assert_ratings_match_reviews()
+        assert Title.objects.get(pk=titles[1].pk).rating is None
+
+    def test_05_cascade_deletes(self, rated_titles):
+        titles, authors, _ = rated_titles
+        authors[0].delete()
+        assert_ratings_match_reviews()
+
+        titles[0].delete()
+        assert_ratings_match_reviews()
+        assert Title.objects.get(pk=titles[1].pk).rating_count == 2
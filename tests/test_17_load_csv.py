@@ -0,0 +1,310 @@
+import io
+import multiprocessing
+import os
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from api.cache import get_versions
+from reviews.management.commands.load_csv import Command
+from reviews.models import (
+    Category, Comment, Genre, Review, Title, TitleGenre, User
+)
+from reviews.signals import rows_loaded
+from tests.test_16_ratings import assert_ratings_match_reviews
+
+HEADERS = {
+    'users.csv': 'id,username,email,role,bio,first_name,last_name',
+    'category.csv': 'id,name,slug',
+    'genre.csv': 'id,name,slug',
+    'titles.csv': 'id,name,year,category',
+    'review.csv': 'id,title_id,text,author,score,pub_date',
+    'comments.csv': 'id,review_id,text,author,pub_date',
+    'genre_title.csv': 'id,title_id,genre_id',
+}
+ROWS = {
+    'users.csv': [
+        '1,reader,reader@yamdb.fake,user,,,',
+        '2,critic,critic@yamdb.fake,user,,,',
+    ],
+    'category.csv': ['1,Фильм,movie'],
+    'genre.csv': ['1,Драма,drama'],
+    'titles.csv': ['1,Солярис,1972,1', '2,Сталкер,1979,1'],
+    'review.csv': [
+        '1,1,Отзыв,1,8,2020-01-01T00:00:00.000Z',
+        '2,1,Отзыв,2,5,2020-01-02T00:00:00.000Z',
+        '3,2,Отзыв,1,10,2020-01-03T00:00:00.000Z',
+    ],
+    'comments.csv': ['1,1,Комментарий,2,2020-01-04T00:00:00.000Z'],
+    'genre_title.csv': ['1,1,1', '2,2,1'],
+}
+
+
+def write_data(path, rows=None):
+    """CSV всех моделей в каталоге path; rows заменяет строки файлов."""
+    rows = {**ROWS, **(rows or {})}
+    for filename, header in HEADERS.items():
+        (path / filename).write_text(
+            '\n'.join((header, *rows[filename])) + '\n', encoding='utf-8'
+        )
+    return path
+
+
+def get_state():
+    """Содержимое всех загружаемых таблиц, кроме времени создания."""
+    return {
+        model.__name__: [
+            {key: value for key, value in row.items() if key != 'date_joined'}
+            for row in model.objects.order_by('id').values()
+        ]
+        for model in (User, Category, Genre, Title, Review, Comment,
+                      TitleGenre)
+    }
+
+
+def load_csv(data_dir, **options):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    call_command(
+        'load_csv', data_dir=str(data_dir), stdout=stdout, stderr=stderr,
+        **options
+    )
+    return stdout.getvalue(), stderr.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+class Test17LoadCsvErrors:
+
+    def test_01_missing_foreign_key(self, tmp_path):
+        write_data(tmp_path, {
+            'titles.csv': [*ROWS['titles.csv'], '3,Зеркало,1975,99'],
+        })
+
+        stdout, stderr = load_csv(tmp_path)
+
+        assert sorted(Title.objects.values_list('id', flat=True)) == [1, 2], (
+            'Проверьте, что `load_csv` пропускает строку с несуществующим '
+            'внешним ключом и загружает остальные.'
+        )
+        assert stderr.splitlines() == [
+            'titles.csv, строка 4: столбец category: Category с id=99 '
+            'не найден'
+        ], (
+            'Проверьте, что `load_csv` сообщает файл, строку и столбец с '
+            'несуществующим внешним ключом.'
+        )
+        assert 'пропущено строк с ошибками: 1' in stdout
+
+    def test_02_malformed_int(self, tmp_path):
+        write_data(tmp_path, {'review.csv': [
+            '1,1,Отзыв,1,восемь,2020-01-01T00:00:00.000Z',
+        ]})
+
+        _, stderr = load_csv(tmp_path)
+
+        assert not Review.objects.exists()
+        assert stderr.startswith('review.csv, строка 2: столбец score: '), (
+            'Проверьте, что `load_csv` сообщает строку и столбец с '
+            'некорректным целым числом.'
+        )
+
+    def test_03_mixed_file(self, tmp_path):
+        write_data(tmp_path, {'review.csv': [
+            '1,1,Отзыв,1,8,2020-01-01T00:00:00.000Z',
+            '2,1,Отзыв,99,5,2020-01-02T00:00:00.000Z',
+            '3,2,Отзыв,1,десять,2020-01-03T00:00:00.000Z',
+            '4,2,Отзыв,2,6,2020-01-04T00:00:00.000Z',
+            '5,99,Отзыв,2,6,2020-01-05T00:00:00.000Z',
+        ]})
+
+        stdout, stderr = load_csv(tmp_path)
+
+        assert sorted(Review.objects.values_list('id', flat=True)) == [
+            1, 4
+        ], 'Проверьте, что `load_csv` загружает верные строки файла.'
+        assert [line.split(':')[:2] for line in stderr.splitlines()] == [
+            ['review.csv, строка 4', ' столбец score'],
+            ['review.csv, строка 3', ' столбец author'],
+            ['review.csv, строка 6', ' столбец title_id'],
+        ], (
+            'Проверьте, что `load_csv` сообщает о каждой пропущенной '
+            'строке.'
+        )
+        assert 'пропущено строк с ошибками: 3' in stdout
+        # Комментарий ссылается на загруженный отзыв 1.
+        assert Comment.objects.count() == 1
+        assert Title.objects.get(pk=1).rating == 8
+        assert User.objects.count() == 2
+        assert TitleGenre.objects.count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+class Test17LoadCsvBatches:
+    ROWS = {'review.csv': [
+        *ROWS['review.csv'],
+        '4,2,Отзыв,2,вторник,2020-01-04T00:00:00.000Z',
+        '5,2,Отзыв,2,3,2020-01-05T00:00:00.000Z',
+        '6,99,Отзыв,2,3,2020-01-06T00:00:00.000Z',
+    ]}
+
+    @pytest.mark.parametrize('batch_size', (1, 2, 4))
+    def test_01_same_result_as_single_batch(self, tmp_path, batch_size):
+        write_data(tmp_path, self.ROWS)
+        _, single_stderr = load_csv(tmp_path, batch_size=1000)
+        expected = get_state()
+        call_command('flush', interactive=False, verbosity=0)
+
+        _, stderr = load_csv(tmp_path, batch_size=batch_size)
+
+        assert get_state() == expected, (
+            'Проверьте, что загрузка пачками по `--batch-size` строк даёт '
+            'ту же базу, что и загрузка одной пачкой.'
+        )
+        assert sorted(stderr.splitlines()) == sorted(
+            single_stderr.splitlines()
+        ), 'Проверьте, что ошибки строк не зависят от `--batch-size`.'
+        assert Title.objects.get(pk=2).rating == 6
+
+    @pytest.mark.parametrize('batch_size', (0, -1))
+    def test_02_invalid_batch_size(self, tmp_path, batch_size):
+        write_data(tmp_path)
+        with pytest.raises(CommandError):
+            load_csv(tmp_path, batch_size=batch_size)
+        assert not User.objects.exists(), (
+            'Проверьте, что `load_csv` с `--batch-size` меньше 1 '
+            'ничего не загружает.'
+        )
+
+    def test_03_one_signal_per_file(self, tmp_path):
+        write_data(tmp_path, self.ROWS)
+        senders = []
+
+        def receiver(sender, **kwargs):
+            senders.append(sender)
+
+        versions = get_versions('reviews', 'comments')
+        rows_loaded.connect(receiver)
+        try:
+            load_csv(tmp_path, batch_size=1)
+        finally:
+            rows_loaded.disconnect(receiver)
+
+        assert sorted(senders, key=lambda model: model.__name__) == sorted(
+            (User, Category, Genre, Title, Review, Comment, TitleGenre),
+            key=lambda model: model.__name__
+        ), (
+            'Проверьте, что `load_csv` отправляет `rows_loaded` один раз на '
+            'файл, а не на каждую пачку.'
+        )
+        assert all(
+            old != new for old, new in zip(
+                versions, get_versions('reviews', 'comments')
+            )
+        ), (
+            'Проверьте, что загрузка отзывов и комментариев меняет общую '
+            'версию вложенных списков.'
+        )
+
+
+@pytest.mark.django_db(transaction=True)
+class Test17LoadCsvJobs:
+
+    def test_01_same_result_as_sequential(self, tmp_path):
+        write_data(tmp_path, Test17LoadCsvBatches.ROWS)
+        _, sequential_stderr = load_csv(tmp_path, batch_size=2)
+        expected = get_state()
+        call_command('flush', interactive=False, verbosity=0)
+
+        _, stderr = load_csv(tmp_path, batch_size=2, jobs=3)
+
+        assert get_state() == expected, (
+            'Проверьте, что `load_csv --jobs` загружает то же, что и '
+            'последовательная загрузка.'
+        )
+        assert stderr == sequential_stderr, (
+            'Проверьте, что `load_csv --jobs` сообщает те же ошибки строк в '
+            'том же порядке.'
+        )
+
+    def test_02_dead_worker(self):
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        queue.put(('rows', []))
+        # Процесс выходит, не записав в очередь завершающий None.
+        process = context.Process(target=os._exit, args=(3,))
+        process.start()
+        command = Command()
+        command.queue_timeout = 0.1
+
+        items = command.read_queue(process, queue, 'review.csv')
+
+        assert next(items) == ('rows', [])
+        with pytest.raises(CommandError, match='кодом 3'):
+            next(items)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test17LoadCsvUpsert:
+    ROWS = {
+        'titles.csv': [*ROWS['titles.csv'], '3,Зеркало,1975,1'],
+        'review.csv': [
+            *ROWS['review.csv'], '4,3,Отзыв,2,7,2020-01-05T00:00:00.000Z'
+        ],
+    }
+
+    def test_01_counts(self, tmp_path):
+        write_data(tmp_path, self.ROWS)
+        load_csv(tmp_path)
+        write_data(tmp_path, {**self.ROWS, 'review.csv': [
+            '1,1,Отзыв,1,2,2020-01-01T00:00:00.000Z',
+            *self.ROWS['review.csv'][1:],
+            '5,2,Отзыв,2,4,2020-01-06T00:00:00.000Z',
+        ]})
+
+        stdout, stderr = load_csv(tmp_path, upsert=True)
+
+        assert not stderr
+        summaries = {
+            line.split(':')[0]: line.split(': ')[1]
+            for line in stdout.splitlines() if 'без изменений' in line
+        }
+        assert summaries['review.csv'] == (
+            'новых 1, обновлено 1, без изменений 3.'
+        ), (
+            'Проверьте, что `load_csv --upsert` считает новые, обновлённые и '
+            'неизменные строки.'
+        )
+        assert summaries['users.csv'] == (
+            'новых 0, обновлено 0, без изменений 2.'
+        )
+        assert summaries['genre_title.csv'] == (
+            'новых 0, обновлено 0, без изменений 2.'
+        )
+        assert Review.objects.get(pk=1).score == 2
+        assert Review.objects.count() == 5
+
+    def test_02_ratings_after_update(self, tmp_path):
+        write_data(tmp_path, self.ROWS)
+        load_csv(tmp_path)
+        # Рейтинг произведения без изменённых отзывов не пересчитывается:
+        # заведомо неверное значение остаётся.
+        Title.objects.filter(pk=3).update(rating=1)
+        write_data(tmp_path, {**self.ROWS, 'review.csv': [
+            '1,1,Отзыв,1,8,2020-01-01T00:00:00.000Z',
+            # Отзыв переносится с произведения 1 на 2: старое произведение
+            # пересчитывается, хотя его отзывы в файле не изменились.
+            '2,2,Отзыв,2,5,2020-01-02T00:00:00.000Z',
+            '3,2,Отзыв,1,10,2020-01-03T00:00:00.000Z',
+            '4,3,Отзыв,2,7,2020-01-05T00:00:00.000Z',
+        ]})
+
+        load_csv(tmp_path, upsert=True)
+
+        assert Title.objects.get(pk=3).rating == 1, (
+            'Проверьте, что `load_csv --upsert` пересчитывает рейтинг только '
+            'произведений с новыми или изменёнными отзывами.'
+        )
+        Title.objects.filter(pk=3).update(rating=7)
+        assert_ratings_match_reviews()
+        assert list(Title.objects.order_by('pk').values_list(
+            'rating', flat=True
+        )) == [8, 7, 7]
@@ -0,0 +1,103 @@
+import datetime
+import io
+import uuid
+from decimal import Decimal
+
+import pytest
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+
+RENDER_CASES = {
+    'datetime': {
+        'aware': datetime.datetime(
+            2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc
+        ),
+        'naive': datetime.datetime(2024, 1, 2, 3, 4, 5),
+        'local': timezone.localtime(),
+        'date': datetime.date(2024, 1, 2),
+        'time': datetime.time(3, 4, 5, 600),
+        'delta': datetime.timedelta(days=1, seconds=5),
+    },
+    'decimal': [Decimal('7.25'), Decimal('10'), Decimal('-0.5')],
+    'lazy': {'message': gettext_lazy('This field is required.')},
+    'separators': 'строка\u2028абзац\u2029конец',
+    'uuid': uuid.UUID(int=1),
+    'keys': {1: 'один', None: 'нет', True: 'да'},
+    'long_int': [2 ** 64, -(2 ** 70), {'id': 10 ** 30}],
+    'nested': {'results': [{'id': 1, 'genre': [], 'category': None}]},
+}
+
+PARSE_CASES = {
+    'unicode': '{"name": "Солярис\\u2028 \u2029", "score": 10}'.encode(),
+    'long_int': (
+        b'{"id": 123456789012345678901234567890, '
+        b'"n": -9223372036854775809}'
+    ),
+    'infinity': b'[1e400]',
+    'surrogate': b'["\\ud800"]',
+    'duplicate_keys': b'{"a": 1, "a": 2}',
+}
+
+INVALID_JSON = {
+    'truncated': b'{"name": ',
+    'nan': b'[NaN]',
+    'trailing': b'{"a": 1} x',
+}
+
+
+def parse(parser, body):
+    return parser.parse(
+        io.BytesIO(body), parser_context={'encoding': 'utf-8'}
+    )
+
+
+class Test18FastJSONRenderer:
+
+    @pytest.mark.parametrize('name', RENDER_CASES)
+    def test_01_same_bytes_as_drf(self, name):
+        data = RENDER_CASES[name]
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(
+            data
+        ), (
+            f'Проверьте, что `FastJSONRenderer` выдаёт те же байты, что и '
+            f'`JSONRenderer`, для случая `{name}`.'
+        )
+
+    def test_02_unknown_type(self):
+        for renderer in (FastJSONRenderer(), JSONRenderer()):
+            with pytest.raises(TypeError):
+                renderer.render({'value': object()})
+
+    def test_03_empty(self):
+        assert FastJSONRenderer().render(None) == b''
+
+
+class Test18FastJSONParser:
+
+    @pytest.mark.parametrize('name', PARSE_CASES)
+    def test_01_same_data_as_drf(self, name):
+        body = PARSE_CASES[name]
+        fast = parse(FastJSONParser(), body)
+        expected = parse(JSONParser(), body)
+        assert fast == expected and repr(fast) == repr(expected), (
+            f'Проверьте, что `FastJSONParser` разбирает случай `{name}` так '
+            'же, как `JSONParser`.'
+        )
+
+    @pytest.mark.parametrize('name', INVALID_JSON)
+    def test_02_same_errors_as_drf(self, name):
+        body = INVALID_JSON[name]
+        with pytest.raises(ParseError) as expected:
+            parse(JSONParser(), body)
+        with pytest.raises(ParseError) as fast:
+            parse(FastJSONParser(), body)
+        assert str(fast.value) == str(expected.value), (
+            'Проверьте, что `FastJSONParser` сообщает об ошибке разбора '
+            f'так же, как `JSONParser`, для случая `{name}`.'
+        )
@@ -0,0 +1,77 @@
+import io
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from reviews.management.commands.load_csv import Command as LoadCommand
+from reviews.models import Review, User
+from tests.test_16_ratings import assert_ratings_match_reviews
+from tests.test_17_load_csv import get_state, load_csv
+
+COUNTS = {
+    'users': 8,
+    'categories': 2,
+    'genres': 3,
+    'titles': 6,
+    'reviews': 20,
+    'comments': 15,
+}
+
+
+def generate_data(**options):
+    call_command('generate_data', stdout=io.StringIO(), **COUNTS, **options)
+
+
+def read_files(path):
+    return {
+        filename: (path / filename).read_text(encoding='utf-8')
+        for filename in LoadCommand.models_files.values()
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+class Test19GenerateData:
+
+    def test_01_same_seed_same_files(self, tmp_path):
+        for name, seed in (('first', 7), ('second', 7), ('other', 8)):
+            generate_data(seed=seed, output=str(tmp_path / name))
+
+        assert read_files(tmp_path / 'first') == read_files(
+            tmp_path / 'second'
+        ), 'Проверьте, что с одним `--seed` файлы `generate_data` совпадают.'
+        assert read_files(tmp_path / 'first') != read_files(
+            tmp_path / 'other'
+        ), 'Проверьте, что `--seed` меняет сгенерированные данные.'
+
+    def test_02_output_loads_cleanly(self, tmp_path):
+        generate_data(seed=3, output=str(tmp_path))
+
+        stdout, stderr = load_csv(tmp_path)
+
+        assert not stderr, (
+            'Проверьте, что CSV из `generate_data --output` загружаются '
+            '`load_csv` без ошибок строк.'
+        )
+        assert User.objects.count() == COUNTS['users']
+        assert Review.objects.count() == COUNTS['reviews']
+        assert_ratings_match_reviews()
+        loaded = get_state()
+        call_command('flush', interactive=False, verbosity=0)
+
+        generate_data(seed=3)
+
+        assert get_state() == loaded, (
+            'Проверьте, что `generate_data` без `--output` пишет в базу те '
+            'же строки, что попадают в CSV.'
+        )
+
+    def test_03_non_empty_database(self):
+        generate_data(seed=3)
+        state = get_state()
+
+        with pytest.raises(CommandError, match='flush'):
+            generate_data(seed=4)
+
+        assert get_state() == state, (
+            'Проверьте, что `generate_data` не пишет в непустую базу.'
+        )